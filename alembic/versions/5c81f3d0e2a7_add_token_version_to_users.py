@@ -0,0 +1,28 @@
+"""Add token_version to users
+
+Revision ID: 5c81f3d0e2a7
+Revises: b7d2e4a91c3f
+Create Date: 2026-10-16 14:03:27.915402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c81f3d0e2a7'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e4a91c3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
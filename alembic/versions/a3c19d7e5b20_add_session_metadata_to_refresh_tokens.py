@@ -0,0 +1,36 @@
+"""Add session metadata to refresh_tokens
+
+Revision ID: a3c19d7e5b20
+Revises: e4f92a7c1b05
+Create Date: 2026-10-17 09:12:40.118265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c19d7e5b20'
+down_revision: Union[str, Sequence[str], None] = 'e4f92a7c1b05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_tokens', sa.Column('device', sa.String(length=100), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('ip_address', sa.String(length=45), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('user_agent', sa.String(length=500), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('last_used_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_refresh_tokens_user_id_revoked_expires_at', 'refresh_tokens', ['user_id', 'revoked', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_tokens_user_id_revoked_expires_at', table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'last_used_at')
+    op.drop_column('refresh_tokens', 'user_agent')
+    op.drop_column('refresh_tokens', 'ip_address')
+    op.drop_column('refresh_tokens', 'device')
@@ -0,0 +1,47 @@
+"""Add mail outbox table
+
+Revision ID: b7d2e4a91c3f
+Revises: 3610a0f6bbed
+Create Date: 2026-10-16 10:12:41.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4a91c3f'
+down_revision: Union[str, Sequence[str], None] = '3610a0f6bbed'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('subject', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mail_outbox_id'), 'mail_outbox', ['id'], unique=False)
+    op.create_index(op.f('ix_mail_outbox_recipient'), 'mail_outbox', ['recipient'], unique=False)
+    op.create_index('ix_mail_outbox_status_next_attempt_at', 'mail_outbox', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mail_outbox_status_next_attempt_at', table_name='mail_outbox')
+    op.drop_index(op.f('ix_mail_outbox_recipient'), table_name='mail_outbox')
+    op.drop_index(op.f('ix_mail_outbox_id'), table_name='mail_outbox')
+    op.drop_table('mail_outbox')
@@ -0,0 +1,28 @@
+"""Index refresh_tokens by user_id, created_at
+
+Revision ID: c81d4f2a9e36
+Revises: a3c19d7e5b20
+Create Date: 2026-10-17 11:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d4f2a9e36'
+down_revision: Union[str, Sequence[str], None] = 'a3c19d7e5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_refresh_tokens_user_id_created_at', 'refresh_tokens', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_tokens_user_id_created_at', table_name='refresh_tokens')
@@ -0,0 +1,33 @@
+"""Add revoked_at to refresh_tokens
+
+Revision ID: d5a8e3f17c42
+Revises: c81d4f2a9e36
+Create Date: 2026-10-16 10:42:18.306554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8e3f17c42'
+down_revision: Union[str, Sequence[str], None] = 'c81d4f2a9e36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_tokens', sa.Column('revoked_at', sa.DateTime(), nullable=True))
+    # The real revocation time of existing rows is unknown; counting from now
+    # keeps them for the full grace period instead of reaping them early
+    op.execute(
+        sa.text('UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE revoked = :revoked').bindparams(revoked=True)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('refresh_tokens', 'revoked_at')
@@ -0,0 +1,38 @@
+"""Widen users.otp for HMAC digests
+
+Revision ID: e4f92a7c1b05
+Revises: 5c81f3d0e2a7
+Create Date: 2026-10-16 23:48:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f92a7c1b05'
+down_revision: Union[str, Sequence[str], None] = '5c81f3d0e2a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Pending plaintext codes cannot be converted to digests; drop them and
+    # let those users request a new OTP.
+    op.execute("UPDATE users SET otp = NULL, otp_expires_at = NULL, otp_attempts = 0 WHERE otp IS NOT NULL")
+    op.alter_column('users', 'otp',
+               existing_type=sa.String(length=6),
+               type_=sa.String(length=128),
+               existing_nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE users SET otp = NULL, otp_expires_at = NULL, otp_attempts = 0 WHERE otp IS NOT NULL")
+    op.alter_column('users', 'otp',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=6),
+               existing_nullable=True)
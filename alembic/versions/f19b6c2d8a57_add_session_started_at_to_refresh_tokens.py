@@ -0,0 +1,31 @@
+"""Add session_started_at to refresh_tokens
+
+Revision ID: f19b6c2d8a57
+Revises: d5a8e3f17c42
+Create Date: 2026-10-16 14:27:51.918203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19b6c2d8a57'
+down_revision: Union[str, Sequence[str], None] = 'd5a8e3f17c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_tokens', sa.Column('session_started_at', sa.DateTime(), nullable=True))
+    # Earlier rotations did not keep the sign-in time; the current token's
+    # issue time is the closest value available
+    op.execute('UPDATE refresh_tokens SET session_started_at = created_at')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('refresh_tokens', 'session_started_at')
@@ -0,0 +1,13 @@
+"""Load and micro-benchmarks for the auth service.
+
+Runs against a throwaway SQLite database (or ``--database-url``), a local
+stub SMTP server and a fake Google signing key, so no external service is
+contacted::
+
+    python -m benchmarks                       # micro + in-process + uvicorn
+    python -m benchmarks --suite micro --output before.json
+    python -m benchmarks.compare before.json after.json
+
+The ``benchmarks.environment`` module must configure the environment before
+anything under ``src`` is imported, because settings are read at import time.
+"""
@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+
+SUITES = ("micro", "inprocess", "uvicorn")
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args) -> dict:
+    """Run one suite in this process. ``src`` is imported only after the
+    environment points at the benchmark stand-ins."""
+    from . import environment
+
+    sink = environment.configure(args.database_url)
+    if args.suite == "micro":
+        from . import micro
+
+        return {"micro": micro.run(min_time=args.min_time)}
+
+    from src.main import app
+
+    from . import load
+
+    google_keys = environment.install_fake_google()
+    runner = load.run_in_process if args.suite == "inprocess" else load.run_over_uvicorn
+    results = asyncio.run(runner(app, sink, google_keys, args.requests, args.concurrency))
+    return {"app_version": app.version, "load": {args.suite: results}}
+
+
+def run_all(args) -> dict:
+    """Run each suite in a fresh interpreter so module-level state (engine,
+    pools, caches) and the database never leak from one suite to the next."""
+    report = {"micro": {}, "load": {}}
+    for suite in SUITES:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            output = f.name
+        command = [
+            sys.executable, "-m", "benchmarks",
+            "--suite", suite,
+            "--requests", str(args.requests),
+            "--concurrency", str(args.concurrency),
+            "--min-time", str(args.min_time),
+            "--output", output,
+        ]
+        if args.database_url:
+            command += ["--database-url", args.database_url]
+        try:
+            # The app logs to stdout; keep it out of a report printed there.
+            subprocess.run(command, check=True, stdout=sys.stderr)
+            with open(output) as f:
+                result = json.load(f)
+        finally:
+            os.unlink(output)
+
+        report["micro"].update(result.get("micro", {}))
+        report["load"].update(result.get("load", {}))
+        if result.get("app_version"):
+            report["app_version"] = result["app_version"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the auth service")
+    parser.add_argument("--suite", choices=("all",) + SUITES, default="all")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per micro-benchmark")
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL; defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc)
+    report = run_all(args) if args.suite == "all" else run_suite(args)
+    report["meta"] = {
+        "started_at": started.isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": (args.database_url or "sqlite").split(":", 1)[0],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
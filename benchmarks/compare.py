@@ -0,0 +1,45 @@
+"""Print the change between two ``python -m benchmarks`` JSON reports."""
+import argparse
+import json
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(old: dict, new: dict) -> list:
+    rows = []
+    for name, new_result in new.get("micro", {}).items():
+        old_result = old.get("micro", {}).get(name)
+        if old_result:
+            rows.append((f"micro/{name}", "ops_per_sec", old_result["ops_per_sec"], new_result["ops_per_sec"]))
+
+    for mode, endpoints in new.get("load", {}).items():
+        for endpoint, new_result in endpoints.items():
+            old_result = old.get("load", {}).get(mode, {}).get(endpoint)
+            if not old_result:
+                continue
+            for metric in ("rps", "p50", "p95", "p99"):
+                rows.append((f"{mode}/{endpoint}", metric, old_result[metric], new_result[metric]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    for name, metric, before, after in compare(old, new):
+        print(f"{name:<32} {metric:<12} {before:>12} {after:>12} {_change(before, after):>9}")
+
+
+if __name__ == "__main__":
+    main()
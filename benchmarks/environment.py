@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+from .smtp_sink import SMTPSink
+
+
+GOOGLE_CLIENT_ID = "benchmark-client.apps.googleusercontent.com"
+
+
+def configure(database_url: str = None) -> SMTPSink:
+    """Point the app at local stand-ins; call before importing ``src``.
+
+    Returns the running SMTP sink the app will deliver to.
+    """
+    sink = SMTPSink().start()
+    if database_url is None:
+        db_dir = tempfile.mkdtemp(prefix="auth-bench-")
+        database_url = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "SECRET_KEY": os.environ.get("SECRET_KEY") or "benchmark-secret-key-not-for-production",
+        "SENDER_EMAIL": "bench@example.com",
+        "SENDER_PASSWORD": "",
+        "SMTP_HOST": sink.host,
+        "SMTP_PORT": str(sink.port),
+        "SMTP_STARTTLS": "false",
+        "MAIL_POLL_INTERVAL": "0.05",
+        "GOOGLE_CLIENT_ID": GOOGLE_CLIENT_ID,
+        "REAPER_ENABLED": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    return sink
+
+
+def install_fake_google():
+    """Swap the Google cert fetcher for a local key set and return it."""
+    from src.google_certs import google_cert_cache
+
+    from .fake_google import FakeGoogleKeys
+
+    keys = FakeGoogleKeys(GOOGLE_CLIENT_ID)
+    google_cert_cache.fetcher = keys.fetcher
+    google_cert_cache.refresh()
+    return keys
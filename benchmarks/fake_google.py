@@ -0,0 +1,58 @@
+import datetime
+import time
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+
+class FakeGoogleKeys:
+    """An RSA key and self-signed cert standing in for Google's signing keys.
+
+    ``fetcher`` has the same shape as ``google_certs.fetch_google_certs`` and
+    can be handed to ``GoogleCertCache``; ``id_token`` mints ID tokens that
+    the cache will accept for ``audience``.
+    """
+
+    def __init__(self, audience: str, kid: str = "benchmark-key"):
+        self.audience = audience
+        self.kid = kid
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+
+    def fetcher(self) -> tuple:
+        return {self.kid: self.cert_pem}, 3600
+
+    def id_token(self, subject: str, email: str, name: str = None) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": self.audience,
+            "sub": subject,
+            "email": email,
+            "email_verified": True,
+            "name": name or email.split("@")[0],
+            "iat": now,
+            "exp": now + 3600,
+        }
+        return jwt.encode(self._signer, payload).decode("utf-8")
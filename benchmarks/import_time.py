@@ -0,0 +1,124 @@
+"""Measure how long ``import src.main`` takes in a fresh interpreter, using
+``python -X importtime``:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 800 --repeat 9 --json
+
+Each run starts a new interpreter so nothing is cached in ``sys.modules``.
+Reports the median total, the time per top-level package (self time summed
+over its modules) and the slowest direct imports of ``src.main``.
+
+Exits 1 if the median exceeds ``--budget-ms`` or if a module that the app
+loads on first use (Jinja2, python-jose, google-auth, requests, bcrypt) was
+imported eagerly.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from . import environment
+
+
+TARGET = "src.main"
+# Loaded on first use: templates on the first page, JWT and Google libraries
+# on the first token, hashing libraries in the hashing pool.
+DEFERRED = ("jinja2", "jose", "google.auth", "requests", "bcrypt", "argon2", "brotli")
+
+
+def parse_importtime(stderr: str) -> list:
+    """``-X importtime`` lines -> ``[(module, depth, self_us, cumulative_us)]``."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_once() -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {TARGET} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def summarize(modules: list, top: int) -> dict:
+    end = next(index for index, (name, depth, _, _) in enumerate(modules) if name == TARGET and depth == 0)
+    total_us = modules[end][3]
+    # Only the subtree of the target, not the interpreter's own startup imports
+    start = end
+    while start > 0 and modules[start - 1][1] > 0:
+        start -= 1
+    app_modules = modules[start:end + 1]
+
+    packages = defaultdict(int)
+    for name, _, self_us, _ in app_modules:
+        packages[name.split(".")[0]] += self_us
+    direct = [(name, cumulative) for name, depth, _, cumulative in app_modules if depth == 1]
+
+    names = {name for name, _, _, _ in app_modules}
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(app_modules),
+        "packages_ms": {
+            name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        },
+        "direct_imports_ms": {
+            name: round(us / 1000, 1) for name, us in sorted(direct, key=lambda item: -item[1])[:top]
+        },
+        "eager_deferred_modules": [
+            module for module in DEFERRED if any(name == module or name.startswith(module + ".") for name in names)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Import time of {TARGET} with a budget")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="fail if the median import exceeds this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="packages and imports to list")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL; defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    # The app reads its settings at import; the child interpreters inherit them
+    sink = environment.configure(args.database_url)
+    try:
+        runs = sorted((summarize(measure_once(), args.top) for _ in range(args.repeat)), key=lambda run: run["total_ms"])
+    finally:
+        sink.stop()
+    result = runs[len(runs) // 2]
+    result.update({
+        "runs_ms": [run["total_ms"] for run in runs],
+        "budget_ms": args.budget_ms,
+        "within_budget": result["total_ms"] <= args.budget_ms,
+    })
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import {TARGET}: {result['total_ms']:.1f} ms median of {args.repeat} "
+              f"({result['modules']} modules), budget {args.budget_ms:.0f} ms")
+        print(f"\n{'package (self time)':<40}{'ms':>8}")
+        for name, ms in result["packages_ms"].items():
+            print(f"{name:<40}{ms:>8.1f}")
+        print(f"\n{'direct import of ' + TARGET + ' (cumulative)':<40}{'ms':>8}")
+        for name, ms in result["direct_imports_ms"].items():
+            print(f"{name:<40}{ms:>8.1f}")
+        for module in result["eager_deferred_modules"]:
+            print(f"FAIL {module} is imported eagerly")
+        if not result["within_budget"]:
+            print(f"FAIL median {result['total_ms']:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+
+    sys.exit(0 if result["within_budget"] and not result["eager_deferred_modules"] else 1)
+
+
+if __name__ == "__main__":
+    main()
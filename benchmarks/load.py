@@ -0,0 +1,200 @@
+import asyncio
+import secrets
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from .stats import summarize
+
+
+PASSWORD = "benchmark-password"
+
+
+class Recorder:
+    """Latencies and errors for one endpoint, possibly over several rounds."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    async def drive(self, count: int, concurrency: int, op) -> None:
+        """Issue ``count`` requests from ``concurrency`` workers.
+
+        ``op(worker, seq)`` sends one request and returns the response.
+        """
+        sequence = iter(range(count))
+
+        async def worker(worker_id: int):
+            for seq in sequence:
+                t0 = time.perf_counter()
+                try:
+                    response = await op(worker_id, seq)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                self.latencies.append(time.perf_counter() - t0)
+                self.errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(min(concurrency, count))))
+        self.elapsed += time.perf_counter() - started
+
+    def summary(self) -> dict:
+        return summarize(self.latencies, self.elapsed, self.errors)
+
+
+class AuthFlowBenchmark:
+    """Runs every auth endpoint against ``client`` and collects per-endpoint stats.
+
+    A pool of ``concurrency`` accounts is registered first; the later
+    scenarios log those accounts in, verify their OTPs (read back from the
+    SMTP sink), rotate their refresh tokens and call ``/auth/me``. Each
+    worker owns one account for refresh so rotations never race.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, sink, google_keys, requests: int, concurrency: int):
+        self.client = client
+        self.sink = sink
+        self.google_keys = google_keys
+        self.requests = requests
+        self.concurrency = max(1, min(concurrency, requests))
+        self.prefix = secrets.token_hex(3)
+        self.accounts = [self._email(i) for i in range(self.concurrency)]
+        self.tokens = {}
+
+    def _email(self, seq: int) -> str:
+        return f"bench-{self.prefix}-{seq}@example.com"
+
+    async def register(self) -> dict:
+        recorder = Recorder()
+        await recorder.drive(self.requests, self.concurrency, lambda w, seq: self.client.post(
+            "/register/",
+            json={"username": f"b{self.prefix}{seq}", "email": self._email(seq), "password": PASSWORD},
+        ))
+        return recorder.summary()
+
+    def _login(self, email: str):
+        return self.client.post("/login/", json={"email": email, "password": PASSWORD})
+
+    async def login(self) -> dict:
+        recorder = Recorder()
+        await recorder.drive(self.requests, self.concurrency, lambda w, seq: self._login(
+            self.accounts[seq % len(self.accounts)]
+        ))
+        return recorder.summary()
+
+    async def verify_otp(self) -> dict:
+        recorder = Recorder()
+        otps = {}
+
+        async def verify(worker_id: int, seq: int):
+            email = self.accounts[seq]
+            response = await self.client.post("/verify_otp/", json={"email": email, "otp": otps[email]})
+            if response.status_code == 200:
+                body = response.json()
+                self.tokens[email] = (body["access_token"], body["refresh_token"])
+            return response
+
+        remaining = self.requests
+        while remaining > 0:
+            # Untimed: issue a fresh OTP to every account and read it back.
+            await asyncio.to_thread(self.sink.wait_idle)
+            self.sink.clear()
+            await asyncio.gather(*(self._login(email) for email in self.accounts))
+            for email in self.accounts:
+                otps[email] = await asyncio.to_thread(self.sink.pop_otp, email)
+
+            batch = min(remaining, len(self.accounts))
+            await recorder.drive(batch, self.concurrency, verify)
+            remaining -= batch
+        return recorder.summary()
+
+    async def refresh(self) -> dict:
+        recorder = Recorder()
+
+        async def rotate(worker_id: int, seq: int):
+            email = self.accounts[worker_id]
+            access_token, refresh_token = self.tokens[email]
+            response = await self.client.post("/auth/refresh", json={"refresh_token": refresh_token})
+            if response.status_code == 200:
+                body = response.json()
+                self.tokens[email] = (body["access_token"], body["refresh_token"])
+            return response
+
+        await recorder.drive(self.requests, self.concurrency, rotate)
+        return recorder.summary()
+
+    async def me(self) -> dict:
+        recorder = Recorder()
+        await recorder.drive(self.requests, self.concurrency, lambda w, seq: self.client.get(
+            "/auth/me",
+            headers={"Authorization": f"Bearer {self.tokens[self.accounts[w]][0]}"},
+        ))
+        return recorder.summary()
+
+    async def google(self) -> dict:
+        id_tokens = [
+            self.google_keys.id_token(f"{self.prefix}-{i}", f"google-{self.prefix}-{i}@example.com")
+            for i in range(self.concurrency)
+        ]
+        # Untimed: create the accounts so the timed run measures returning
+        # sign-ins rather than racing first-time sign-ins of one account.
+        for id_token in id_tokens:
+            await self.client.post("/auth/google", json={"token": id_token})
+
+        recorder = Recorder()
+        await recorder.drive(self.requests, self.concurrency, lambda w, seq: self.client.post(
+            "/auth/google", json={"token": id_tokens[seq % len(id_tokens)]}
+        ))
+        return recorder.summary()
+
+    async def run(self) -> dict:
+        results = {}
+        for name, scenario in (
+            ("register", self.register),
+            ("login", self.login),
+            ("verify_otp", self.verify_otp),
+            ("refresh", self.refresh),
+            ("me", self.me),
+            ("google", self.google),
+        ):
+            results[name] = await scenario()
+        return results
+
+
+async def run_in_process(app, sink, google_keys, requests: int, concurrency: int) -> dict:
+    """Call the ASGI app directly, without sockets or an HTTP server."""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return await AuthFlowBenchmark(client, sink, google_keys, requests, concurrency).run()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_over_uvicorn(app, sink, google_keys, requests: int, concurrency: int) -> dict:
+    """Serve the app with uvicorn on a local port and call it over HTTP."""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn exited during startup")
+            await asyncio.sleep(0.05)
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            return await AuthFlowBenchmark(client, sink, google_keys, requests, concurrency).run()
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
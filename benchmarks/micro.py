@@ -0,0 +1,83 @@
+import secrets
+import time
+
+import bcrypt
+
+from .stats import summarize
+
+
+def measure(fn, min_time: float = 1.0, min_iterations: int = 5) -> dict:
+    """Call ``fn`` repeatedly for at least ``min_time`` seconds.
+
+    Latencies are reported in microseconds.
+    """
+    fn()  # warm-up
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < min_iterations or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed, unit=1_000_000)
+    return {
+        "iterations": result["requests"],
+        "ops_per_sec": result["rps"],
+        "mean_us": result["mean"],
+        "p50_us": result["p50"],
+        "p95_us": result["p95"],
+        "p99_us": result["p99"],
+    }
+
+
+def run(min_time: float = 1.0, bcrypt_rounds: tuple = (10, 12)) -> dict:
+    from src.auth import create_access_token, hash_token
+    from src.crud import generate_otp
+    from src.keys import decode_jwt
+    from src.email_filter import BloomFilter
+    from src.otp_store import check_otp, hash_otp
+    from src.pages import landing_page
+    from starlette.requests import Request
+
+    claims = {"sub": "bench@example.com", "user_id": 1, "ver": 0}
+    access_token = create_access_token(claims)
+    refresh_token = secrets.token_urlsafe(32)
+    password = b"correct horse battery staple"
+    otp_hash = hash_otp("424242")
+    bloom = BloomFilter(1000000, 0.01)
+    for i in range(100000):
+        bloom.add(f"user{i}@example.com".encode())
+    page_request = Request({"type": "http", "headers": [(b"accept-encoding", b"gzip, deflate, br")]})
+
+    results = {
+        "create_access_token": measure(lambda: create_access_token(claims), min_time),
+        "decode_access_token": measure(lambda: decode_jwt(access_token), min_time),
+        "hash_token": measure(lambda: hash_token(refresh_token), min_time),
+        "generate_otp": measure(lambda: generate_otp(None, "bench@example.com"), min_time),
+        "hash_otp": measure(lambda: hash_otp("424242"), min_time),
+        "check_otp": measure(lambda: check_otp("424242", otp_hash), min_time),
+        "email_filter_lookup": measure(lambda: b"unknown@example.com" in bloom, min_time),
+        "landing_page_render": measure(landing_page.render, min_time),
+        "landing_page_cached": measure(lambda: landing_page.get().response(page_request, "no-cache"), min_time),
+    }
+    for rounds in bcrypt_rounds:
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+        results[f"bcrypt_hash_rounds_{rounds}"] = measure(
+            lambda: bcrypt.hashpw(password, bcrypt.gensalt(rounds)), min_time, min_iterations=3
+        )
+        results[f"bcrypt_check_rounds_{rounds}"] = measure(
+            lambda: bcrypt.checkpw(password, hashed), min_time, min_iterations=3
+        )
+    from src.hashing import Argon2Hasher, _argon2_hash
+
+    try:
+        scheme = Argon2Hasher()
+    except RuntimeError:  # argon2-cffi not installed
+        return results
+    results["argon2id_hash_default_cost"] = measure(
+        lambda: _argon2_hash(password, scheme.time_cost, scheme.memory_cost, scheme.parallelism),
+        min_time,
+        min_iterations=3,
+    )
+    return results
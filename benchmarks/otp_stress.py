@@ -0,0 +1,118 @@
+"""Hammer ``/verify_otp/`` with concurrent submissions and check the OTP
+store's guarantees hold:
+
+* of many concurrent correct submissions exactly one succeeds;
+* no more than ``OTP_ATTEMPTS`` wrong guesses are ever counted, and the
+  right code is refused once they are used up;
+* with the right code hidden among concurrent wrong ones, at most one
+  submission succeeds.
+
+    python -m benchmarks.otp_stress --backend memory
+    python -m benchmarks.otp_stress --backend database --concurrency 20
+    python -m benchmarks.otp_stress --backend redis    # needs REDIS_URL
+
+Exits 1 if any round violates a guarantee or a request errors out.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+from . import environment
+
+
+EMAIL = "stress@example.com"
+CODE = "424242"
+
+
+def _wrong_codes(count: int) -> list:
+    codes = random.sample(range(1000000), count + 1)
+    return [f"{code:06d}" for code in codes if f"{code:06d}" != CODE][:count]
+
+
+class Outcome:
+    def __init__(self, responses: list):
+        self.accepted = sum(1 for r in responses if r.status_code == 200)
+        self.invalid = sum(1 for r in responses if r.status_code == 400 and r.json().get("detail") == "Invalid OTP")
+        self.errors = sum(1 for r in responses if r.status_code >= 500)
+
+
+async def _submit_all(client, codes: list) -> Outcome:
+    responses = await asyncio.gather(*(
+        client.post("/verify_otp/", json={"email": EMAIL, "otp": code}) for code in codes
+    ))
+    return Outcome(responses)
+
+
+async def run(app, rounds: int, concurrency: int) -> dict:
+    import httpx
+
+    from src.config import settings
+    from src.otp_store import otp_store
+
+    max_attempts = settings.OTP_ATTEMPTS
+    report = {
+        name: {"rounds": rounds, "violations": 0, "errors": 0}
+        for name in ("concurrent_correct", "concurrent_guesses", "mixed")
+    }
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            response = await client.post(
+                "/register/", json={"username": "stress", "email": EMAIL, "password": "stress-password"}
+            )
+            response.raise_for_status()
+
+            for _ in range(rounds):
+                await otp_store.save(EMAIL, CODE, settings.OTP_TTL_SECONDS)
+                outcome = await _submit_all(client, [CODE] * concurrency)
+                report["concurrent_correct"]["errors"] += outcome.errors
+                report["concurrent_correct"]["violations"] += outcome.accepted != 1
+
+                await otp_store.save(EMAIL, CODE, settings.OTP_TTL_SECONDS)
+                outcome = await _submit_all(client, _wrong_codes(concurrency))
+                late = await _submit_all(client, [CODE])
+                report["concurrent_guesses"]["errors"] += outcome.errors + late.errors
+                report["concurrent_guesses"]["violations"] += (
+                    outcome.accepted > 0
+                    or outcome.invalid > max_attempts
+                    or (concurrency >= max_attempts and late.accepted > 0)
+                )
+
+                await otp_store.save(EMAIL, CODE, settings.OTP_TTL_SECONDS)
+                codes = _wrong_codes(concurrency - 1) + [CODE]
+                random.shuffle(codes)
+                outcome = await _submit_all(client, codes)
+                report["mixed"]["errors"] += outcome.errors
+                report["mixed"]["violations"] += outcome.accepted > 1 or outcome.invalid > max_attempts
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency stress test for OTP verification")
+    parser.add_argument("--backend", choices=("memory", "database", "redis"), default="memory")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL; defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    environment.configure(args.database_url)
+    os.environ["OTP_STORE_BACKEND"] = args.backend
+    from src.main import app
+
+    report = asyncio.run(run(app, args.rounds, args.concurrency))
+    report["backend"] = args.backend
+    report["concurrency"] = args.concurrency
+    print(json.dumps(report, indent=2, sort_keys=True))
+    failed = any(
+        isinstance(result, dict) and (result["violations"] or result["errors"]) for result in report.values()
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Check read/write routing against a primary and replicas that are plain
+local SQLite files (the replicas never receive the primary's writes, which
+makes every misrouted read visible):
+
+    python -m benchmarks.replicas
+
+Checks that reads round-robin over the healthy replicas, that writes and
+reads after a write in the same transaction go to the primary, that a
+client carrying the read-your-writes deadline from its last commit reads
+from the primary until it passes, and that a replica failing its health check is taken out of
+rotation. Exits 1 if any check fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+
+from . import environment
+
+
+async def run(window: float) -> list:
+    from sqlalchemy import event, select, update
+
+    from src.crud import create_user, get_user_by_email
+    from src.db import SessionLocal, engine, replica_set
+    from src.models import BaseModel, User
+
+    names = {engine.sync_engine: "primary"}
+    for index, replica in enumerate(replica_set.engines):
+        names[replica.sync_engine] = f"replica{index + 1}"
+    routed = []
+    for sync_engine, name in names.items():
+        event.listen(
+            sync_engine, "before_cursor_execute",
+            lambda *args, name=name: routed.append(name),
+        )
+
+    healthy_replicas = [replica for replica in replica_set.engines if "missing" not in str(replica.url)]
+    for target in [engine] + healthy_replicas:
+        async with target.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+    results = []
+
+    def expect(name: str, ok: bool, detail) -> None:
+        results.append((name, ok, str(detail)))
+
+    await replica_set.check()
+    expect("broken replica marked unhealthy", list(replica_set.stats().values()) == [True, True, False], replica_set.stats())
+
+    routed.clear()
+    async with SessionLocal() as db:
+        await create_user(db, "routed", "routed@example.com", None)
+        await db.commit()
+        # What get_db would send back to the client in the read-your-writes cookie
+        writer_deadline = db.info["primary_until"]
+    expect("insert goes to the primary", set(routed) == {"primary"}, routed)
+
+    routed.clear()
+    for _ in range(6):
+        async with SessionLocal() as db:
+            found = await get_user_by_email(db, "routed@example.com")
+            if found is not None:
+                routed.append("saw-primary-data")
+    expect("reads round-robin over healthy replicas", Counter(routed) == {"replica1": 3, "replica2": 3}, dict(Counter(routed)))
+
+    routed.clear()
+    async with SessionLocal() as db:
+        await db.execute(update(User).where(User.email == "routed@example.com").values(is_verified=True))
+        found = await get_user_by_email(db, "routed@example.com")
+        await db.commit()
+    expect("read after a write in the transaction uses the primary", routed == ["primary", "primary"] and found is not None, routed)
+
+    routed.clear()
+    async with SessionLocal() as db:
+        db.info["primary_until"] = writer_deadline
+        found = await get_user_by_email(db, "routed@example.com")
+    expect("read-your-writes keeps the writer on the primary", routed == ["primary"] and found is not None, routed)
+
+    routed.clear()
+    async with SessionLocal() as db:
+        await db.execute(select(User.id).limit(1))
+    expect("other clients still read from replicas", routed[0].startswith("replica"), routed)
+
+    await asyncio.sleep(window + 0.1)
+    routed.clear()
+    async with SessionLocal() as db:
+        db.info["primary_until"] = writer_deadline
+        await get_user_by_email(db, "routed@example.com")
+    expect("writer returns to replicas after the window", routed[0].startswith("replica"), routed)
+
+    routed.clear()
+    async with SessionLocal() as db:
+        await db.execute(select(User.id).with_for_update().limit(1))
+    expect("locking reads go to the primary", routed == ["primary"], routed)
+
+    await replica_set.close()
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check read/write routing over SQLite replicas")
+    parser.add_argument("--window", type=float, default=0.5, help="read-your-writes window in seconds")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="replicas-")
+    environment.configure(f"sqlite:///{os.path.join(directory, 'primary.db')}")
+    os.environ["DATABASE_REPLICA_URLS"] = ",".join([
+        f"sqlite:///{os.path.join(directory, 'replica1.db')}",
+        f"sqlite:///{os.path.join(directory, 'replica2.db')}",
+        f"sqlite:///{os.path.join(directory, 'missing', 'replica3.db')}",
+    ])
+    os.environ["DB_READ_YOUR_WRITES_SECONDS"] = str(args.window)
+
+    results = asyncio.run(run(args.window))
+    for name, ok, detail in results:
+        print(f"{'ok' if ok else 'FAIL':<5}{name:<58}{detail}")
+    sys.exit(0 if all(ok for _, ok, _ in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Show that the per-user session cap keeps revoke-all cheap.
+
+Signs one user in ``N`` times (no logouts) for increasing ``N``, then times
+``revoke_all_user_refresh_tokens`` with and without ``MAX_SESSIONS_PER_USER``:
+
+    python -m benchmarks.revoke_all
+    python -m benchmarks.revoke_all --sign-ins 10 100 1000 5000 --cap 10 --repeat 5
+
+Without a cap the UPDATE touches every token the user ever got; with it the
+row count and time stay flat. Exits 1 if a capped run revokes more than
+``--cap`` tokens.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from . import environment
+
+
+async def _revoke_all_cost(session_factory, repo_class, user, sign_ins: int, cap: int, repeat: int) -> dict:
+    from src.crud import revoke_all_user_refresh_tokens
+    from src.models import RefreshToken
+    from sqlalchemy import delete
+
+    repo = repo_class(session_factory=session_factory, write_behind=False, max_sessions=cap)
+    async with session_factory() as db:
+        await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id))
+        await db.commit()
+
+    timings = []
+    revoked = 0
+    for attempt in range(repeat):
+        async with session_factory() as db:
+            for i in range(sign_ins):
+                expires_at = datetime.utcnow() + timedelta(days=7)
+                await repo.add(db, user, f"bench-{cap}-{sign_ins}-{attempt}-{i}", expires_at)
+
+        async with session_factory() as db:
+            started = time.perf_counter()
+            revoked = await revoke_all_user_refresh_tokens(db, user.id)
+            timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    return {
+        "sign_ins": sign_ins,
+        "cap": cap,
+        "revoked": revoked,
+        "revoke_all_ms_median": round(timings[len(timings) // 2] * 1000, 3),
+        "evicted": repo.evicted,
+    }
+
+
+async def run(sign_in_counts: list, cap: int, repeat: int) -> list:
+    from src.crud import create_user
+    from src.db import SessionLocal, engine
+    from src.models import BaseModel
+    from src.refresh_tokens import RefreshTokenRepository
+
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+    async with SessionLocal() as db:
+        user = await create_user(db, "revoker", "revoker@example.com", None)
+        await db.commit()
+
+    results = []
+    try:
+        for sign_ins in sign_in_counts:
+            for limit in (0, cap):
+                results.append(await _revoke_all_cost(SessionLocal, RefreshTokenRepository, user, sign_ins, limit, repeat))
+    finally:
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="revoke-all cost with and without a session cap")
+    parser.add_argument("--sign-ins", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--cap", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL; defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    environment.configure(args.database_url)
+    results = asyncio.run(run(args.sign_ins, args.cap, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'sign-ins':>9} {'cap':>5} {'revoked':>8} {'revoke-all ms':>14}")
+        for result in results:
+            print(
+                f"{result['sign_ins']:>9} {result['cap'] or '-':>5} {result['revoked']:>8} "
+                f"{result['revoke_all_ms_median']:>14.3f}"
+            )
+
+    failed = any(result["cap"] and result["revoked"] > result["cap"] for result in results)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
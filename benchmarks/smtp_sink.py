@@ -0,0 +1,115 @@
+import email
+import re
+import socketserver
+import threading
+import time
+
+
+OTP_RE = re.compile(r"OTP\) is: (\d{6})")
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP to accept mail from ``smtplib`` without STARTTLS."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+    def handle(self):
+        self.reply("220 benchmark sink ready")
+        in_data = False
+        lines = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.sink.deliver("\r\n".join(lines))
+                    lines = []
+                    self.reply("250 queued")
+                else:
+                    lines.append(line[1:] if line.startswith("..") else line)
+                continue
+
+            command = line.split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-benchmark-sink")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 authenticated")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 end with <CRLF>.<CRLF>")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    """Local SMTP server that keeps the latest OTP mailed to each address."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._otps = {}
+        self._cond = threading.Condition()
+        self.received = 0
+
+    def deliver(self, raw: str) -> None:
+        message = email.message_from_string(raw)
+        for part in message.walk():
+            if part.get_content_type() != "text/plain":
+                continue
+            match = OTP_RE.search(part.get_payload(decode=True).decode("utf-8"))
+            if match:
+                with self._cond:
+                    self._otps[message["To"]] = match.group(1)
+                    self._cond.notify_all()
+        with self._cond:
+            self.received += 1
+
+    def pop_otp(self, address: str, timeout: float = 10.0) -> str:
+        """Wait for and consume the most recent OTP sent to ``address``."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while address not in self._otps:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No OTP delivered to {address}")
+                self._cond.wait(remaining)
+            return self._otps.pop(address)
+
+    def wait_idle(self, quiet: float = 0.3, timeout: float = 30.0) -> None:
+        """Block until nothing has been delivered for ``quiet`` seconds."""
+        deadline = time.monotonic() + timeout
+        seen = -1
+        while time.monotonic() < deadline:
+            with self._cond:
+                if self.received == seen:
+                    return
+                seen = self.received
+            time.sleep(quiet)
+        raise TimeoutError("SMTP sink kept receiving mail")
+
+    def clear(self) -> None:
+        with self._cond:
+            self._otps.clear()
+
+    def start(self) -> "SMTPSink":
+        threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,139 @@
+"""Check the SQL statement and commit count of each auth endpoint.
+
+    python -m benchmarks.statements          # exits 1 if any budget is exceeded
+    python -m benchmarks.statements -v       # also print every statement
+
+Statements are attributed to a request through a context variable, so
+background work (mail dispatcher, refresh-token write-behind flush) running
+at the same time is not counted against the endpoint.
+"""
+import argparse
+import asyncio
+import contextvars
+import sys
+
+from . import environment
+
+
+# endpoint: (max statements, max commits). Endpoints that start a session
+# include the MAX_SESSIONS_PER_USER eviction SELECT (plus a DELETE when a
+# user is over the cap, which these flows never are). A refresh claims the old
+# token with one conditional UPDATE; the new token's INSERT is write-behind.
+# /auth/me reads nothing while the user's token_version is cached from the
+# sign-in (TOKEN_VERSION_TTL_SECONDS) and one SELECT after that.
+BUDGETS = {
+    "register": (2, 1),
+    "login": (2, 1),
+    "verify_otp": (3, 1),
+    "refresh": (1, 1),
+    "me": (0, 0),
+    "google_new_user": (4, 1),
+    "google_link_account": (4, 1),
+    "google_returning_user": (3, 1),
+}
+
+_recording = contextvars.ContextVar("recording", default=None)
+
+
+class Recording:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+
+def _instrument(sync_engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        recording = _recording.get()
+        if recording is not None:
+            recording.statements.append(" ".join(statement.split()))
+
+    @event.listens_for(sync_engine, "commit")
+    def _commit(conn):
+        recording = _recording.get()
+        if recording is not None:
+            recording.commits += 1
+
+
+async def _record(results: dict, name: str, request):
+    recording = Recording()
+    token = _recording.set(recording)
+    try:
+        response = await request
+    finally:
+        _recording.reset(token)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{name} failed with {response.status_code}: {response.text}")
+    results[name] = recording
+    return response
+
+
+async def measure(app, sink, google_keys) -> dict:
+    import httpx
+
+    results = {}
+    password = "statement-budget"
+    email = "budget@example.com"
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await _record(results, "register", client.post(
+                "/register/", json={"username": "budget", "email": email, "password": password}
+            ))
+            await _record(results, "login", client.post("/login/", json={"email": email, "password": password}))
+            otp = await asyncio.to_thread(sink.pop_otp, email)
+            response = await _record(results, "verify_otp", client.post(
+                "/verify_otp/", json={"email": email, "otp": otp}
+            ))
+            tokens = response.json()
+
+            response = await _record(results, "refresh", client.post(
+                "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+            ))
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            await _record(results, "me", client.get("/auth/me", headers=headers))
+
+            new_user = google_keys.id_token("budget-google-1", "budget-google@example.com")
+            await _record(results, "google_new_user", client.post("/auth/google", json={"token": new_user}))
+            await _record(results, "google_returning_user", client.post("/auth/google", json={"token": new_user}))
+            link = google_keys.id_token("budget-google-2", email)
+            await _record(results, "google_link_account", client.post("/auth/google", json={"token": link}))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check per-endpoint SQL statement budgets")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL; defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    sink = environment.configure(args.database_url)
+    from src.db import engine
+    from src.main import app
+
+    _instrument(engine.sync_engine)
+    google_keys = environment.install_fake_google()
+    results = asyncio.run(measure(app, sink, google_keys))
+
+    failed = False
+    for name, (max_statements, max_commits) in BUDGETS.items():
+        recording = results[name]
+        over = len(recording.statements) > max_statements or recording.commits > max_commits
+        failed = failed or over
+        print(
+            f"{'FAIL' if over else 'ok':<5}{name:<24}"
+            f"statements {len(recording.statements)}/{max_statements}  commits {recording.commits}/{max_commits}"
+        )
+        if args.verbose or over:
+            for statement in recording.statements:
+                print(f"       {statement}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import statistics
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0, unit: float = 1000.0) -> dict:
+    """Latency percentiles (milliseconds by default) and throughput."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean": round(statistics.fmean(values) * unit, 3) if values else 0.0,
+        "p50": round(percentile(values, 0.50) * unit, 3),
+        "p95": round(percentile(values, 0.95) * unit, 3),
+        "p99": round(percentile(values, 0.99) * unit, 3),
+        "max": round(values[-1] * unit, 3) if values else 0.0,
+    }
@@ -1,23 +1,23 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from datetime import datetime, timedelta
-from jose import JWTError, jwt  
-from google.oauth2 import id_token
-from google.auth.transport import requests
 import hashlib
 import secrets 
 import logging
 from .config import settings
-from .db import get_db
+from .db import PrimarySessionLocal
+from .hashing import password_hasher
+from .google_certs import google_cert_cache
+from .keys import encode_jwt, decode_jwt, InvalidTokenError
+from .token_cache import token_cache, token_versions, UserSnapshot
+from .refresh_tokens import refresh_token_repo
 from .crud import (
     get_user_by_email,
-    create_refresh_token_record,
-    get_refresh_token_by_hash,
-    revoke_refresh_token_by_hash,
-    revoke_all_user_refresh_tokens,
-    delete_expired_refresh_tokens,
+    get_user_token_version,
+    increment_token_version,
+    update_password_hash,
 )
 
 
@@ -33,49 +33,103 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = encode_jwt(to_encode)
     return encoded_jwt
 
+def access_token_claims(user)->dict:
+    """Claims for an access token that carry everything UserResponse needs.
+
+    ``ver`` is the user's token version; bumping it on revoke-all makes
+    older access tokens unacceptable to the claims-only dependency.
+    """
+    return {
+        "sub": user.email,
+        "user_id": user.id,
+        "usr": {
+            "username": user.username,
+            "picture": user.profile_picture,
+            "is_verified": bool(user.is_verified),
+            "oauth_provider": user.oauth_provider,
+        },
+        "ver": user.token_version or 0,
+    }
+
+async def upgrade_password_hash(user_id: int, old_hash: str, password: str)->None:
+    """Re-hash a just-verified password with the current scheme and cost.
+
+    Runs as a background task after the login response is sent.
+    """
+    try:
+        new_hash = await password_hasher.hash_password(password)
+        async with PrimarySessionLocal() as db:
+            upgraded = await update_password_hash(db, user_id, old_hash, new_hash)
+        if upgraded:
+            logger.info(f"Upgraded password hash for user {user_id} to {password_hasher.scheme.name}")
+    except Exception as e:
+        logger.error(f"Password hash upgrade failed for user {user_id}: {str(e)}")
+
 def hash_token(token: str)->str:
     return hashlib.sha256(token.encode()).hexdigest()
 
-def create_refresh_token(db: Session, user_id: int, email: str)->str:
+def _new_refresh_token()->tuple:
     token = secrets.token_urlsafe(32)
-    token_hash = hash_token(token)
     expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    create_refresh_token_record(db, user_id, token_hash, expires_at)
-    logger.info(f"Created refresh token for user {user_id}")
+    return token, hash_token(token), expires_at
+
+async def create_refresh_token(db: AsyncSession, user, client: dict = None)->str:
+    token, token_hash, expires_at = _new_refresh_token()
+    await refresh_token_repo.add(db, user, token_hash, expires_at, client)
+    logger.info(f"Created refresh token for user {user.id}")
 
     return  token
 
-def verify_refresh_token(db: Session, token: str):
+async def _lookup_refresh_token(db: AsyncSession, token: str):
+    token_hash = hash_token(token)
+    found = await refresh_token_repo.lookup(token_hash)
+
+    if not found:
+        logger.warning("Refresh token not found or revoked")
+        return None
+
+    db_token, user = found
+    if db_token.expires_at < datetime.utcnow():
+        logger.warning(f"Refresh token expired for user {db_token.user_id}")
+        await refresh_token_repo.revoke(db, token_hash)
+        return None
+
+    return db_token, user
+
+async def verify_refresh_token(db: AsyncSession, token: str):
     try:
-        token_hash = hash_token(token)
-        db_token = get_refresh_token_by_hash
-        
-        if not db_token:
-            logger.warning("Refresh token not found or revoked")
-            return None
-        
-        if db_token.expires_at < datetime.utcnow():
-            logger.warning(f"Refresh token expired for user {db_token.user_id}")
-            revoke_refresh_token_by_hash(db, token_hash)
+        found = await _lookup_refresh_token(db, token)
+        return found[1] if found else None
+    except Exception as e:
+        logger.error(f"Error verifying refresh token: {str(e)}")
+
+async def rotate_refresh_token(db: AsyncSession, token: str):
+    """Swap a valid refresh token for a new one (one-time use).
+
+    Returns ``(user, new_token)`` or ``None`` if the token is not usable.
+    """
+    try:
+        found = await _lookup_refresh_token(db, token)
+        if not found:
             return None
-        
-        user =  db_token.user
 
-        if not user:
-            logger.error(f"User not found for token user_id {db_token.user_id}")
+        db_token, user = found
+        new_token, new_hash, expires_at = _new_refresh_token()
+        if not await refresh_token_repo.rotate(db, db_token, new_hash, expires_at):
+            logger.warning(f"Refresh token for user {db_token.user_id} was already rotated or revoked")
             return None
-        
-        return user
+        return user, new_token
     except Exception as e:
-        logger.error(f"Error verifying refresh token: {str(e)}")
+        logger.error(f"Error rotating refresh token: {str(e)}")
+        return None
 
-def revoke_refresh_token(db: Session, token: str)->bool:
+async def revoke_refresh_token(db: AsyncSession, token: str)->bool:
     try:
         token_hash = hash_token(token)
-        success = revoke_refresh_token_by_hash(db, token_hash)
+        success = await refresh_token_repo.revoke(db, token_hash)
         
         if success:
             logger.info(f"Revoked refresh token")
@@ -85,9 +139,11 @@ def revoke_refresh_token(db: Session, token: str)->bool:
         logger.error(f"Error revoking token: {str(e)}")
         return False
 
-def revoke_all_user_tokens(db: Session, user_id: int)->int:
+async def revoke_all_user_tokens(db: AsyncSession, user_id: int)->int:
     try:
-        count = revoke_all_user_refresh_tokens(db, user_id)
+        count = await refresh_token_repo.revoke_all(db, user_id)
+        token_versions.observe(user_id, await increment_token_version(db, user_id))
+        token_cache.invalidate_user(user_id)
         logger.info(f"Revoked {count} tokens for user {user_id}")
         return count
     
@@ -95,27 +151,10 @@ def revoke_all_user_tokens(db: Session, user_id: int)->int:
         logger.error(f"Error revoking all tokens for user {user_id}: {str(e)}")
         raise
 
-def cleanup_expired_tokens(db: Session)->int:
+async def verify_google_token(token: str):
     try:
-        deleted = delete_expired_refresh_tokens(db)
-        logger.info(f"Cleaned up {deleted} expired/revoked tokens")
-        return deleted
-    except Exception as e:
-        logger.error(f"Error cleaning up tokens: {str(e)}")
-        raise
-
+        idinfo = await google_cert_cache.verify_id_token(token, settings.GOOGLE_CLIENT_ID)
 
-def verify_google_token(token: str):
-    try:
-        idinfo = id_token.verify_oauth2_token(
-            token,
-            requests.Request(),
-            settings.GOOGLE_CLIENT_ID
-        )
-
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('wrong issuer.')
-        
         return {
             'email': idinfo['email'],
             'name': idinfo.get('name', idinfo['email'].split('@')[0]),
@@ -131,27 +170,92 @@ def verify_google_token(token: str):
         logger.error(f"Unexpected error verifying token: {str(e)}")
         return None
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def _credentials_exception()->HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+        credentials_exception = _credentials_exception()
+
+        cached = token_cache.get(token)
+        if cached is not None:
+            return cached[1]
 
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            payload = decode_jwt(token)
             
             email: str = payload.get("sub")
             if email is None:
                 raise credentials_exception
     
-        except JWTError:
+        except InvalidTokenError:
             raise credentials_exception
         
-        user = get_user_by_email(db, email)
+        # The primary: a replica may not have the user's latest token_version yet
+        async with PrimarySessionLocal() as db:
+            user = await get_user_by_email(db, email)
         if user is None:
             raise credentials_exception
+
+        token_versions.observe(user.id, user.token_version)
+        if payload.get("ver", 0) < (user.token_version or 0):
+            raise credentials_exception
         
-        return user
+        snapshot = UserSnapshot.from_user(user)
+        token_cache.put(token, payload, snapshot)
+        return snapshot
+
+async def _token_version_floor(user_id: int):
+    """Lowest ``ver`` still accepted for ``user_id``, or None if the user is gone."""
+    version = token_versions.get(user_id)
+    if version is None:
+        async with PrimarySessionLocal() as db:
+            version = await get_user_token_version(db, user_id)
+        if version is None:
+            return None
+        token_versions.observe(user_id, version)
+    return version
+
+async def get_current_user_claims(token: str = Depends(oauth2_scheme)):
+    """Claims-only variant of get_current_user.
+
+    The user is rebuilt from the ``usr`` claim; tokens minted before profile
+    claims existed fall back to the regular lookup. The only query is a
+    ``token_version`` read when this process has not seen the user within
+    ``TOKEN_VERSION_TTL_SECONDS``, so a revoke-all on any worker is enforced.
+    """
+    try:
+        payload = decode_jwt(token)
+    except InvalidTokenError:
+        raise _credentials_exception()
+
+    profile = payload.get("usr")
+    user_id = payload.get("user_id")
+    if profile is None or user_id is None or payload.get("sub") is None:
+        return await get_current_user(token)
+
+    floor = await _token_version_floor(user_id)
+    if floor is None or payload.get("ver", 0) < floor:
+        raise _credentials_exception()
 
+    return UserSnapshot(
+        id=user_id,
+        username=profile.get("username"),
+        email=payload["sub"],
+        oauth_provider=profile.get("oauth_provider"),
+        profile_picture=profile.get("picture"),
+        is_verified=profile.get("is_verified", False),
+        token_version=payload.get("ver", 0),
+    )
 
+async def get_current_admin(current_user = Depends(get_current_user)):
+    """``get_current_user`` restricted to accounts listed in ``ADMIN_EMAILS``
+    (tokens are only issued after an OTP or Google sign-in, so the email is
+    proven); everyone else gets a 403."""
+    admins = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -0,0 +1,378 @@
+"""Bulk user import and export.
+
+Imports stream CSV or NDJSON records in batches: each batch is validated,
+deduplicated (within the import and against ``users``), has its plaintext
+passwords hashed on a dedicated process pool and is written with a single
+executemany that lets the unique email index drop late duplicates. Memory
+use is bounded by the batch size, not the file size.
+
+In the web app every import shares one process pool, started on the first
+import and kept for the life of the worker, and at most
+``BULK_IMPORT_MAX_CONCURRENT`` imports run at once. The CLI gets a pool of
+its own sized by ``--workers``.
+
+Exports page through ``users`` by primary key (keyset pagination), one short
+session per page, so the table is never loaded as a whole.
+
+    python -m src.bulk_users import users.csv --batch-size 500
+    python -m src.bulk_users import users.ndjson --format ndjson
+    python -m src.bulk_users export users.ndjson --format ndjson
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import sys
+import time
+
+from pydantic import ValidationError
+
+from .config import settings
+from .crud import bulk_insert_users, get_existing_emails, get_users_page
+from .db import SessionLocal, engine
+from .hashing import PasswordHashingService, password_hasher
+from .models import User
+from .schemas import BulkUserRecord
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = ("id", "username", "email", "oauth_provider", "is_verified", "user_created_time")
+MAX_REPORTED_ERRORS = 100
+
+
+def format_for(filename: str, default: str = "csv") -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def reject(self, line: int, reason: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.read / elapsed, 1) if elapsed else 0.0,
+            "errors": self.errors,
+        }
+
+
+async def iter_lines(chunks):
+    """Split an async iterable of ``bytes`` chunks into decoded text lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_file_chunks(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as handle:
+        while True:
+            chunk = await asyncio.to_thread(handle.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def iter_records(lines, fmt: str):
+    """Yield ``(line_number, record or None, error)`` for each input record."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+    header = None
+    buffered, start = "", 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "expected a JSON object"
+                continue
+            yield line_number, record, None
+            continue
+
+        # CSV: a quoted field may span lines, so buffer until quotes balance
+        if not buffered:
+            start = line_number
+        buffered = f"{buffered}\n{line}" if buffered else line
+        if buffered.count('"') % 2:
+            continue
+        text, buffered = buffered, ""
+        if not text.strip():
+            continue
+        row = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        if len(row) != len(header):
+            yield start, None, f"expected {len(header)} columns, got {len(row)}"
+            continue
+        yield start, dict(zip(header, row)), None
+
+    if buffered:
+        yield start, None, "unterminated quoted field"
+
+
+def _validate(record: dict):
+    # CSV has no nulls; treat empty cells as missing
+    cleaned = {key: value for key, value in record.items() if value not in ("", None)}
+    try:
+        return BulkUserRecord.model_validate(cleaned), None
+    except ValidationError as e:
+        first = e.errors()[0]
+        return None, f"{'.'.join(str(part) for part in first['loc']) or 'record'}: {first['msg']}"
+
+
+class ImportsBusy(Exception):
+    """Raised when ``BULK_IMPORT_MAX_CONCURRENT`` imports are already running."""
+
+
+def _import_hasher(workers: int, batch_size: int, concurrent: int = 1) -> PasswordHashingService:
+    # Separate from the request-path pool so an import never starves logins;
+    # the queue holds a full batch from each concurrent import
+    return PasswordHashingService(
+        "process", workers, queue_depth=batch_size * concurrent, scheme=password_hasher.scheme
+    )
+
+
+import_hasher = _import_hasher(
+    settings.BULK_IMPORT_HASH_WORKERS, settings.BULK_IMPORT_BATCH_SIZE, settings.BULK_IMPORT_MAX_CONCURRENT
+)
+_import_slots = asyncio.Semaphore(settings.BULK_IMPORT_MAX_CONCURRENT)
+
+
+class UserImporter:
+    """Runs one import; ``on_progress(report)`` is called after every batch.
+
+    Passwords are hashed on ``hasher``, the shared ``import_hasher`` by
+    default; its queue is sized for ``BULK_IMPORT_BATCH_SIZE``, so that is
+    also the largest batch allowed with it.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = None, hasher: PasswordHashingService = None, on_progress=None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+        if hasher is None:
+            hasher = import_hasher
+            self.batch_size = min(self.batch_size, settings.BULK_IMPORT_BATCH_SIZE)
+        self.on_progress = on_progress
+        self.report = ImportReport()
+        self._seen = set()
+        self._hasher = hasher
+
+    async def run(self, records) -> ImportReport:
+        batch = []
+        async for line, record, error in records:
+            self.report.read += 1
+            if error is None:
+                record, error = _validate(record)
+            if error is not None:
+                self.report.reject(line, error)
+                continue
+
+            email = record.email.lower().strip()
+            if email in self._seen:
+                self.report.duplicates += 1
+                continue
+            self._seen.add(email)
+            batch.append((email, record))
+
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = []
+        if batch:
+            await self._flush(batch)
+        return self.report
+
+    async def _flush(self, batch: list) -> None:
+        async with self.session_factory() as db:
+            # Skip known emails before paying for bcrypt on them
+            existing = await get_existing_emails(db, [email for email, _ in batch])
+            fresh = [(email, record) for email, record in batch if email not in existing]
+
+            hashed = await asyncio.gather(*(
+                self._hasher.hash_password(record.password) if record.password else _passthrough(record.hashed_password)
+                for _, record in fresh
+            ))
+            rows = [
+                {
+                    "username": record.username,
+                    "email": email,
+                    "hashed_password": hashed_password,
+                    "is_verified": record.is_verified,
+                }
+                for (email, record), hashed_password in zip(fresh, hashed)
+            ]
+            inserted = await bulk_insert_users(db, rows)
+
+        self.report.batches += 1
+        self.report.inserted += inserted
+        self.report.duplicates += len(batch) - inserted
+        logger.info(
+            f"Bulk import batch {self.report.batches}: {inserted}/{len(batch)} inserted, "
+            f"{self.report.read} records read"
+        )
+        if self.on_progress is not None:
+            self.on_progress(self.report)
+
+
+async def _passthrough(value):
+    return value
+
+
+async def import_users(chunks, fmt: str, **options) -> ImportReport:
+    """Import from an async iterable of ``bytes`` chunks (a file or request body).
+
+    Raises ``ImportsBusy`` rather than queueing when every import slot is taken.
+    """
+    if _import_slots.locked():
+        raise ImportsBusy()
+    async with _import_slots:
+        importer = UserImporter(**options)
+        return await importer.run(iter_records(iter_lines(chunks), fmt))
+
+
+async def iter_users(session_factory=SessionLocal, page_size: int = None, include_password_hashes: bool = False):
+    """Yield user rows as dicts, one keyset page at a time."""
+    page_size = page_size or settings.BULK_EXPORT_PAGE_SIZE
+    names = EXPORT_COLUMNS + (("hashed_password",) if include_password_hashes else ())
+    columns = [getattr(User, name) for name in names]
+    last_id = 0
+    while True:
+        async with session_factory() as db:
+            page = await get_users_page(db, last_id, page_size, columns)
+        if not page:
+            return
+        for row in page:
+            yield dict(zip(names, row))
+        last_id = page[-1][0]
+
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+async def export_users(fmt: str, **options):
+    """Yield the export as text chunks of roughly one page each."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    buffer = io.StringIO()
+    writer = None
+    rows = 0
+    async for user in iter_users(**options):
+        user = {key: _export_value(value) for key, value in user.items()}
+        if fmt == "ndjson":
+            buffer.write(json.dumps(user))
+            buffer.write("\n")
+        else:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(user), lineterminator="\n")
+                writer.writeheader()
+            writer.writerow(user)
+        rows += 1
+        if rows % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if writer is None and fmt == "csv":
+        buffer.write(",".join(EXPORT_COLUMNS) + "\n")
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _print_progress(report: ImportReport) -> None:
+    print(
+        f"\r{report.read} read, {report.inserted} inserted, "
+        f"{report.duplicates} duplicates, {report.invalid} invalid",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+async def _export_to_file(path: str, fmt: str, **options) -> None:
+    output = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        async for chunk in export_users(fmt, **options):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+async def _run_cli(args, fmt: str):
+    try:
+        if args.command == "import":
+            hasher = _import_hasher(args.workers, args.batch_size)
+            try:
+                return await import_users(
+                    iter_file_chunks(args.path), fmt,
+                    batch_size=args.batch_size, hasher=hasher, on_progress=_print_progress,
+                )
+            finally:
+                await asyncio.to_thread(hasher.shutdown)
+        await _export_to_file(
+            args.path, fmt, page_size=args.page_size, include_password_hashes=args.include_password_hashes
+        )
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export users")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="input/output file; '-' for stdout on export")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension, else csv")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.BULK_IMPORT_HASH_WORKERS, help="password hashing processes")
+    parser.add_argument("--page-size", type=int, default=settings.BULK_EXPORT_PAGE_SIZE)
+    parser.add_argument("--include-password-hashes", action="store_true", help="export bcrypt hashes too")
+    args = parser.parse_args()
+
+    report = asyncio.run(_run_cli(args, args.format or format_for(args.path)))
+    if report is not None:
+        print(file=sys.stderr)
+        print(json.dumps(report.as_dict(), indent=2))
+        sys.exit(1 if report.invalid else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,26 @@
-from sqlalchemy.orm import Session
-from .models import User, RefreshToken
-from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, func, or_, and_, case
+from sqlalchemy.orm import selectinload
+from .models import User, RefreshToken, MailOutbox
+from .email_filter import email_filter
+from datetime import datetime
 import secrets
-from .config import settings
 
-def create_user(db: Session, username: str, email: str, hashed_password: str):
+'''Write helpers below stage their changes and leave the commit to the
+caller, so each request commits its unit of work exactly once.'''
+
+async def create_user(db: AsyncSession, username: str, email: str, hashed_password: str):
     db_user = User(
         username=username,
         email=email.strip(),
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    email_filter.add(db_user.email)
     return db_user
 
-def create_oauth_user(db: Session, email: str, username: str, oauth_provider: str, oauth_id: str, profile_picture: str = None):
+async def create_oauth_user(db: AsyncSession, email: str, username: str, oauth_provider: str, oauth_id: str, profile_picture: str = None):
     db_user = User(
         username = username,
         email=email.strip(),
@@ -25,111 +30,413 @@ def create_oauth_user(db: Session, email: str, username: str, oauth_provider: st
         is_verified=True
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    email_filter.add(db_user.email)
     return db_user
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    result = await db.execute(select(User).filter(User.id == user_id))
+    return result.scalars().first()
+
+async def get_user_by_oauth(db: AsyncSession, oauth_provider: str, oauth_id: str):
+    result = await db.execute(
+        select(User).filter(User.oauth_provider==oauth_provider, User.oauth_id==oauth_id)
+    )
+    return result.scalars().first()
+
+async def get_user_for_oauth_login(db: AsyncSession, email: str, oauth_provider: str, oauth_id: str):
+    """One query for the OAuth sign-in lookup: the account with this email,
+    else the account already linked to this provider identity."""
+    result = await db.execute(
+        select(User).filter(
+            or_(
+                User.email == email,
+                and_(User.oauth_provider == oauth_provider, User.oauth_id == oauth_id)
+            )
+        ).order_by(case((User.email == email, 0), else_=1)).limit(1)
+    )
+    return result.scalars().first()
+
+async def link_oauth_account(db: AsyncSession, user_id: int, oauth_provider: str, oauth_id: str, profile_picture: str = None)->bool:
+    """Attach an OAuth identity to an account that has none, in one statement."""
+    result = await db.execute(
+        update(User).where(User.id == user_id, User.oauth_provider.is_(None)).values(
+            oauth_provider=oauth_provider,
+            oauth_id=oauth_id,
+            profile_picture=profile_picture,
+            is_verified=True
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+async def update_password_hash(db: AsyncSession, user_id: int, old_hash: str, new_hash: str)->bool:
+    """Swap in ``new_hash`` only if the stored hash is still ``old_hash``,
+    so a password changed in the meantime is never overwritten. Commits."""
+    result = await db.execute(
+        update(User).where(User.id == user_id, User.hashed_password == old_hash).values(hashed_password=new_hash)
+    )
+    await db.commit()
+    return result.rowcount == 1
 
-def get_user_by_oauth(db: Session, oauth_provider: str, oauth_id: str):
-    return db.query(User).filter(User.oauth_provider==oauth_provider, User.oauth_id==oauth_id).first()
+async def increment_token_version(db: AsyncSession, user_id: int)->int:
+    statement = update(User).where(User.id == user_id).values(token_version=User.token_version + 1)
+    if db.bind.dialect.update_returning:
+        result = await db.execute(statement.returning(User.token_version))
+    else:
+        await db.execute(statement)
+        result = await db.execute(select(User.token_version).filter(User.id == user_id))
+    version = result.scalar_one()
+    await db.commit()
+    return version
 
-def generate_otp(db: Session, email: str):
+async def get_user_token_version(db: AsyncSession, user_id: int):
+    """The user's ``token_version``, or None if the user no longer exists."""
+    result = await db.execute(select(User.token_version).filter(User.id == user_id))
+    row = result.first()
+    return None if row is None else (row[0] or 0)
+
+def generate_otp(db: AsyncSession, email: str):
     return ''.join([str(secrets.randbelow(10)) for _ in range(6)])
 
-def save_otp(db: Session, user: User, otp: str, ttl_seconds: int = 300):
-    user.otp = otp
-    user.otp_expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)  # ✅ Timezone-aware
-    user.otp_attempts = 0
-    db.commit()
-    db.refresh(user)
-    return user
-
-def verify_otp(db: Session, user: User, provided_otp: int) -> bool:
-    if not user or not user.otp:
-        return False
-    
-    now = datetime.now(timezone.utc)
-    
-    if not user.otp_expires_at or user.otp_expires_at < now:
-        user.otp = None
-        user.otp_expires_at = None 
-        db.commit()
-        return False
-    
-    if user.otp_attempts >= settings.OTP_ATTEMPTS:
-        user.otp = None
-        user.otp_expires_at = None
-        db.commit()
-        return False
-
-    if str(user.otp)!=str(provided_otp):
-        user.otp_attempts += 1
-        db.commit()
-        return False
-    
-    user.otp = None
-    user.otp_expires_at = None
-    user.otp_attempts = 0
-    db.commit()
-    return True
-    
+'''OTP crud functions (database OTP store backend)'''
+
+async def save_otp(db: AsyncSession, email: str, otp_hash: str, expires_at: datetime)->None:
+    await db.execute(
+        update(User).where(User.email == email).values(otp=otp_hash, otp_expires_at=expires_at, otp_attempts=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def get_otp_state(db: AsyncSession, email: str):
+    result = await db.execute(
+        select(User.otp, User.otp_expires_at, User.otp_attempts).filter(User.email == email)
+    )
+    return result.first()
+
+async def consume_otp(db: AsyncSession, email: str, otp_hash: str, max_attempts: int)->bool:
+    """Clear the OTP only if it is still ``otp_hash``, unexpired and not locked out.
+
+    A single conditional UPDATE, so of several concurrent correct
+    submissions exactly one sees ``rowcount == 1``.
+    """
+    result = await db.execute(
+        update(User).where(
+            User.email == email,
+            User.otp == otp_hash,
+            User.otp_expires_at > datetime.utcnow(),
+            User.otp_attempts < max_attempts
+        ).values(otp=None, otp_expires_at=None, otp_attempts=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def record_otp_failure(db: AsyncSession, email: str, otp_hash: str, max_attempts: int)->bool:
+    """Count a wrong guess against ``otp_hash``; False if it is no longer live."""
+    result = await db.execute(
+        update(User).where(
+            User.email == email,
+            User.otp == otp_hash,
+            User.otp_expires_at > datetime.utcnow(),
+            User.otp_attempts < max_attempts
+        ).values(otp_attempts=User.otp_attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def clear_otp(db: AsyncSession, email: str)->bool:
+    """Clear the OTP; returns whether a live one was removed."""
+    result = await db.execute(
+        update(User).where(
+            User.email == email,
+            User.otp.is_not(None),
+            User.otp_expires_at > datetime.utcnow()
+        ).values(otp=None, otp_expires_at=None, otp_attempts=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
 '''Refresh Token crud functions'''
 
-def create_refresh_token_record(db:Session, user_id: int, token_hash: str, expires_at: datetime)->RefreshToken:
-    db_token = RefreshToken(
-        user_id = user_id,
-        token_hash = token_hash,
-        expires_at = expires_at
-    )
-    db.add(db_token)
-    db.commit()
-    db.refresh(db_token)
-    return db_token
-
-def get_refresh_token_by_hash(db: Session, token_hash: str)->RefreshToken:
-    return db.query(RefreshToken).filter(
-        RefreshToken.token_hash==token_hash,
-        RefreshToken.revoked==False
-        ).first()
-
-def revoke_refresh_token_by_hash(db: Session, token_hash: str)->bool:
-    db_token = db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).first()
-
-    if db_token:
-        db.token.revoked = True
-        db.commit()
-        return True
-    return False
-
-def revoke_all_user_refresh_tokens(db: Session, user_id: int)->int:
-    count=db.query(RefreshToken).filter(
-        RefreshToken.user_id == user_id,
-        RefreshToken.revoked == False
-    ).update({"revoked": True})
-    db.commit()
-    return count
-
-def delete_expired_refresh_tokens(db: Session)->int:
-    count = db.query(RefreshToken).filter(
-        (RefreshToken.expires_at < datetime.utcnow()),
-        (RefreshToken.revoked==True)
-    ).delete()
-    db.commit()
-    return count
-
-def get_user_active_sessions(db: Session, user_id: int)->list:
-    return db.query(
-        RefreshToken.user_id == user_id,
-        RefreshToken.revoked == False,
-        RefreshToken.expires_at > datetime.utcnow()
-        ).all()
+async def create_refresh_token_record(db: AsyncSession, user_id: int, token_hash: str, expires_at: datetime, client: dict = None, started_at: datetime = None)->None:
+    """``client`` holds the session's ``device``, ``ip_address`` and ``user_agent``."""
+    now = datetime.utcnow()
+    await db.execute(
+        insert(RefreshToken).values(
+            user_id=user_id, token_hash=token_hash, expires_at=expires_at, revoked=False,
+            last_used_at=now, session_started_at=started_at or now, **(client or {})
+        )
+    )
+
+async def evict_oldest_refresh_tokens(db: AsyncSession, user_id: int, keep: int)->list:
+    """Delete the user's unrevoked tokens beyond the newest ``keep``.
+
+    Walks ``ix_refresh_tokens_user_id_created_at`` newest first and returns
+    the evicted token hashes. Leaves the commit to the caller.
+    """
+    result = await db.execute(
+        select(RefreshToken.id, RefreshToken.token_hash).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked == False
+        ).order_by(RefreshToken.created_at.desc(), RefreshToken.id.desc()).offset(keep)
+    )
+    evicted = result.all()
+    if evicted:
+        await db.execute(delete(RefreshToken).where(RefreshToken.id.in_([row.id for row in evicted])))
+    return [row.token_hash for row in evicted]
+
+async def get_refresh_token_by_hash(db: AsyncSession, token_hash: str)->RefreshToken:
+    result = await db.execute(
+        select(RefreshToken).options(selectinload(RefreshToken.user)).filter(
+            RefreshToken.token_hash==token_hash,
+            RefreshToken.revoked==False
+        )
+    )
+    return result.scalars().first()
+
+async def get_refresh_token_with_user(db: AsyncSession, token_hash: str):
+    result = await db.execute(
+        select(RefreshToken, User).join(User, RefreshToken.user_id == User.id).filter(
+            RefreshToken.token_hash==token_hash,
+            RefreshToken.revoked==False
+        )
+    )
+    return result.first()
+
+async def rotate_refresh_token_records(db: AsyncSession, revoked_hashes: list, new_tokens: list)->bool:
+    """Revoke ``revoked_hashes`` and insert ``new_tokens`` in one transaction.
 
-def get_refresh_token_count_by_user(db: Session, user_id: int)->int:
-    return db.query(
+    Only live tokens are revoked: if any of ``revoked_hashes`` is already
+    revoked (by another worker, say) nothing is written and False is
+    returned, so each token can be rotated exactly once.
+    """
+    if revoked_hashes:
+        result = await db.execute(
+            update(RefreshToken).where(
+                RefreshToken.token_hash.in_(revoked_hashes),
+                RefreshToken.revoked == False
+            ).values(revoked=True, revoked_at=datetime.utcnow())
+        )
+        if result.rowcount != len(revoked_hashes):
+            await db.rollback()
+            return False
+    if new_tokens:
+        await db.execute(insert(RefreshToken), new_tokens)
+    await db.commit()
+    return True
+
+async def revoke_refresh_token_by_hash(db: AsyncSession, token_hash: str)->bool:
+    result = await db.execute(
+        update(RefreshToken).where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked == False
+        ).values(revoked=True, revoked_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+async def revoke_all_user_refresh_tokens(db: AsyncSession, user_id: int)->int:
+    result = await db.execute(
+        update(RefreshToken).where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked == False
+        ).values(revoked=True, revoked_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
+
+async def delete_dead_refresh_tokens_chunk(db: AsyncSession, after_id: int, limit: int, revoked_before: datetime)->tuple:
+    """Delete up to ``limit`` expired tokens, or tokens revoked before
+    ``revoked_before``, with id > ``after_id``.
+
+    Rows revoked by older code have no ``revoked_at`` and fall back to
+    ``created_at``. Returns ``(deleted, last_id)``; ``last_id`` is None once the scan is done.
+    """
+    result = await db.execute(
+        select(RefreshToken.id).filter(
+            RefreshToken.id > after_id,
+            (RefreshToken.expires_at < datetime.utcnow())
+            | (
+                (RefreshToken.revoked == True)
+                & (func.coalesce(RefreshToken.revoked_at, RefreshToken.created_at) < revoked_before)
+            )
+        ).order_by(RefreshToken.id).limit(limit)
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return 0, None
+
+    await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+    await db.commit()
+    return len(ids), ids[-1]
+
+async def get_user_active_sessions(db: AsyncSession, user_id: int, limit: int, before: tuple = None)->list:
+    """Keyset page of a user's live refresh tokens, newest first.
+
+    Ordered by ``(expires_at, id)`` so the scan walks
+    ``ix_refresh_tokens_user_id_revoked_expires_at`` without a sort; every
+    token gets the same lifetime, so that is also issue order. ``before`` is
+    the ``(expires_at, id)`` of the last row of the previous page.
+    """
+    query = select(RefreshToken).filter(
         RefreshToken.user_id == user_id,
         RefreshToken.revoked == False,
         RefreshToken.expires_at > datetime.utcnow()
-        ).count()
+    )
+    if before is not None:
+        expires_at, token_id = before
+        query = query.filter(
+            or_(
+                RefreshToken.expires_at < expires_at,
+                and_(RefreshToken.expires_at == expires_at, RefreshToken.id < token_id)
+            )
+        )
+    result = await db.execute(
+        query.order_by(RefreshToken.expires_at.desc(), RefreshToken.id.desc()).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_active_session_token_hash(db: AsyncSession, user_id: int, session_id: int):
+    result = await db.execute(
+        select(RefreshToken.token_hash).filter(
+            RefreshToken.id == session_id,
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked == False
+        )
+    )
+    return result.scalar()
+
+async def get_refresh_token_count_by_user(db: AsyncSession, user_id: int)->int:
+    result = await db.execute(
+        select(func.count(RefreshToken.id)).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.utcnow()
+        )
+    )
+    return result.scalar_one()
+
+'''Mail outbox crud functions'''
 
+async def enqueue_mail(db: AsyncSession, recipient: str, kind: str, subject: str, body: str)->MailOutbox:
+    db_mail = MailOutbox(
+        recipient=recipient,
+        kind=kind,
+        subject=subject,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(db_mail)
+    return db_mail
+
+async def claim_mail_batch(db: AsyncSession, limit: int, dedup_kinds: tuple = ("otp",))->list:
+    """Lock the next due pending rows and supersede stale ones.
+
+    For kinds in ``dedup_kinds`` only the newest pending row per recipient is
+    returned; older rows for the same recipient are marked ``superseded``.
+    """
+    result = await db.execute(
+        select(MailOutbox).filter(
+            MailOutbox.status == "pending",
+            MailOutbox.next_attempt_at <= datetime.utcnow()
+        ).order_by(MailOutbox.id).limit(limit).with_for_update(skip_locked=True)
+    )
+    batch = result.scalars().all()
+
+    dedup_recipients = {(mail.kind, mail.recipient) for mail in batch if mail.kind in dedup_kinds}
+    if not dedup_recipients:
+        return batch
+
+    result = await db.execute(
+        select(MailOutbox.kind, MailOutbox.recipient, func.max(MailOutbox.id)).filter(
+            MailOutbox.status == "pending",
+            MailOutbox.kind.in_({kind for kind, _ in dedup_recipients}),
+            MailOutbox.recipient.in_({recipient for _, recipient in dedup_recipients})
+        ).group_by(MailOutbox.kind, MailOutbox.recipient)
+    )
+    latest = {(kind, recipient): max_id for kind, recipient, max_id in result}
+
+    claimed = []
+    for mail in batch:
+        newest_id = latest.get((mail.kind, mail.recipient))
+        if newest_id is not None and mail.id < newest_id:
+            mail.status = "superseded"
+            mail.body = None
+        else:
+            claimed.append(mail)
+    return claimed
+
+async def get_mail_outbox_stats(db: AsyncSession, sample_size: int = 500)->dict:
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(MailOutbox.status, func.count(MailOutbox.id)).group_by(MailOutbox.status)
+    )
+    counts = dict(result.all())
+    oldest_pending = (await db.execute(
+        select(func.min(MailOutbox.created_at)).filter(MailOutbox.status == "pending")
+    )).scalar()
+    recent = (await db.execute(
+        select(MailOutbox.created_at, MailOutbox.sent_at).filter(
+            MailOutbox.status == "sent"
+        ).order_by(MailOutbox.id.desc()).limit(sample_size)
+    )).all()
+
+    latencies = sorted((sent_at - created_at).total_seconds() for created_at, sent_at in recent)
+    return {
+        "depth": counts.get("pending", 0),
+        "dead": counts.get("dead", 0),
+        "sent": counts.get("sent", 0),
+        "superseded": counts.get("superseded", 0),
+        "oldest_pending_age_seconds": (now - oldest_pending).total_seconds() if oldest_pending else 0,
+        "latency_seconds_avg": sum(latencies) / len(latencies) if latencies else 0,
+        "latency_seconds_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+    }
+
+'''Bulk user import / export crud functions'''
+
+def _insert_users_ignoring_duplicates(dialect_name: str):
+    # Let the unique index on users.email drop rows that already exist
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(User.__table__).on_conflict_do_nothing(index_elements=["email"])
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(User.__table__).on_conflict_do_nothing(index_elements=["email"])
+    if dialect_name == "mysql":
+        return insert(User.__table__).prefix_with("IGNORE")
+    return insert(User.__table__)
+
+async def get_existing_emails(db: AsyncSession, emails: list)->set:
+    if not emails:
+        return set()
+    result = await db.execute(select(User.email).filter(User.email.in_(emails)))
+    return set(result.scalars().all())
+
+async def bulk_insert_users(db: AsyncSession, rows: list)->int:
+    """Insert ``rows`` (dicts of ``users`` columns) with one executemany.
+
+    Emails that already exist are skipped rather than raising; returns the
+    number of rows actually inserted. Commits.
+    """
+    if not rows:
+        return 0
+    result = await db.execute(_insert_users_ignoring_duplicates(db.bind.dialect.name), rows)
+    await db.commit()
+    for row in rows:
+        email_filter.add(row["email"])
+    return result.rowcount
+
+async def get_users_page(db: AsyncSession, after_id: int, limit: int, columns: list)->list:
+    """Keyset page of ``users``: up to ``limit`` rows with id > ``after_id``."""
+    result = await db.execute(
+        select(*columns).filter(User.id > after_id).order_by(User.id).limit(limit)
+    )
+    return result.all()
@@ -1,32 +1,287 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import itertools
+import logging
+import math
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import Select, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .config import settings
 from .models import BaseModel
+from .metrics import instrument_engine, db_pool_checkout_wait, db_routed_statements
+
+
+logger = logging.getLogger(__name__)
+
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap the sync DBAPI driver in ``url`` for its asyncio counterpart.
+
+    ``DATABASE_URL`` stays a sync URL so Alembic can keep using it.
+    """
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        return url
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No async driver configured for {parsed.drivername}")
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": True, "echo": False}
+    # aiosqlite uses a NullPool/StaticPool that takes no sizing arguments
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(poolclass=TimedQueuePool, pool_recycle=1800, pool_size=10, max_overflow=20, pool_timeout=30)
+    return options
+
+
+class ReplicaSet:
+    """Read replicas handed out round-robin, skipping unhealthy ones.
+
+    ``check()`` runs ``SELECT 1`` on every replica; the background task
+    repeats it every ``health_interval`` seconds. A replica that fails the
+    check, or drops a connection mid-query, is skipped until it passes again.
+    With no healthy replica, reads fall back to the primary.
+    """
+
+    def __init__(self, engines: list, health_interval: float = 5.0):
+        self.engines = engines
+        self.health_interval = health_interval
+        self._healthy = [True] * len(engines)
+        self._next = itertools.count()
+        self._task = None
+        for index, replica in enumerate(engines):
+            self._watch_disconnects(index, replica)
+
+    def _watch_disconnects(self, index: int, replica) -> None:
+        @event.listens_for(replica.sync_engine, "handle_error")
+        def _handle_error(context):
+            if context.is_disconnect:
+                self._mark(index, False, str(context.original_exception))
+
+    def _mark(self, index: int, healthy: bool, reason: str = None) -> None:
+        if self._healthy[index] != healthy:
+            url = self.engines[index].url.render_as_string(hide_password=True)
+            if healthy:
+                logger.info(f"Replica {url} is healthy again")
+            else:
+                logger.warning(f"Replica {url} marked unhealthy: {reason}")
+        self._healthy[index] = healthy
+
+    def choose(self):
+        for _ in range(len(self.engines)):
+            index = next(self._next) % len(self.engines)
+            if self._healthy[index]:
+                return self.engines[index]
+        return None
+
+    async def _ping(self, replica) -> None:
+        async with replica.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def check(self) -> None:
+        for index, replica in enumerate(self.engines):
+            try:
+                await asyncio.wait_for(self._ping(replica), timeout=self.health_interval)
+            except Exception as e:
+                self._mark(index, False, str(e) or type(e).__name__)
+            else:
+                self._mark(index, True)
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.engines:
+            await replica.dispose()
+
+    def stats(self) -> dict:
+        return {
+            replica.url.render_as_string(hide_password=True): healthy
+            for replica, healthy in zip(self.engines, self._healthy)
+        }
+
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or to_async_url(settings.DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+instrument_engine(engine.sync_engine)
 
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    echo=False,
+def _create_replica_engines() -> list:
+    replicas = []
+    for url in filter(None, (url.strip() for url in settings.DATABASE_REPLICA_URLS.split(","))):
+        async_url = to_async_url(url)
+        replica = create_async_engine(async_url, **engine_options(async_url))
+        instrument_engine(replica.sync_engine)
+        replicas.append(replica)
+    return replicas
+
+
+replica_set = ReplicaSet(_create_replica_engines(), settings.DB_REPLICA_HEALTH_INTERVAL)
+
+# Carries the read-your-writes deadline (a Unix time) with the client, so it
+# holds on whichever worker serves the next request
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+
+
+def read_your_writes_deadline(request: Request) -> float:
+    """The deadline from the request's cookie, capped at one window from now:
+    a client can only keep its own reads on the primary, and not for long."""
+    try:
+        deadline = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        return 0.0
+    return min(deadline, time.time() + settings.DB_READ_YOUR_WRITES_SECONDS)
+
+
+async def warm_pool(target, connections: int) -> int:
+    """Open up to ``connections`` pooled connections at once and return them
+    to the pool, so early requests find them already connected. Capped at the
+    pool size: overflow connections are closed on return anyway. Engines
+    without a sized pool (SQLite's NullPool) keep nothing, so are skipped."""
+    size = getattr(target.pool, "size", None)
+    if not callable(size):
+        return 0
+    connections = min(connections, size())
+
+    # Hold every connection until all are open so each checkout makes a new one
+    pending = [target.connect() for _ in range(connections)]
+    results = await asyncio.gather(*(conn.start() for conn in pending), return_exceptions=True)
+    await asyncio.gather(*(
+        conn.close() for conn, result in zip(pending, results) if not isinstance(result, BaseException)
+    ))
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return connections
+
+
+async def warm_pools(connections: int) -> None:
+    started = time.perf_counter()
+    warmed = await warm_pool(engine, connections)
+    for replica in replica_set.engines:
+        try:
+            await warm_pool(replica, connections)
+        except Exception as e:
+            # The health check takes it out of rotation; startup carries on
+            logger.warning(f"Could not warm replica {replica.url.render_as_string(hide_password=True)}: {str(e)}")
+    logger.info(f"Warmed {warmed} database connection(s) per engine in {time.perf_counter() - started:.3f}s")
+
+
+def _is_plain_read(clause) -> bool:
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class RoutingSession(Session):
+    """Sends reads to a replica and everything else to the primary.
+
+    Writes, locking reads and statements the session cannot classify go to
+    the primary, and so does every statement after them until the
+    transaction ends (reads inside a write transaction see its writes).
+    After a commit that wrote, reads stay on the primary until
+    ``info["primary_until"]``, ``DB_READ_YOUR_WRITES_SECONDS`` later; ``get_db``
+    hands that deadline to the client as a cookie and reads it back from the
+    client's next request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not replica_set.engines:
+            return engine.sync_engine
+
+        if self._flushing or self.info.get("pinned") or not _is_plain_read(clause):
+            self.info["pinned"] = True
+            db_routed_statements.inc(target="primary")
+            return engine.sync_engine
+
+        replica = None
+        if time.time() >= self.info.get("primary_until", 0):
+            replica = replica_set.choose()
+        if replica is None:
+            db_routed_statements.inc(target="primary")
+            return engine.sync_engine
+        db_routed_statements.inc(target="replica")
+        return replica.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if not session.info.pop("pinned", False) or not replica_set.engines:
+        return
+    window = settings.DB_READ_YOUR_WRITES_SECONDS
+    session.info["primary_until"] = time.time() + window
+    response = session.info.get("response")
+    if response is not None and window > 0:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE, f"{session.info['primary_until']:.3f}",
+            max_age=math.ceil(window), httponly=True, samesite="lax",
+        )
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("pinned", None)
+
+
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
 )
 
-SessionLocal = sessionmaker(
+# For reads that must never be stale (authentication, refresh tokens, OTP
+# checks) and for background writers (the reaper, the mail dispatcher).
+PrimarySessionLocal = async_sessionmaker(
     bind=engine,
-    autocommit=False,
+    class_=AsyncSession,
     autoflush=False,
     expire_on_commit=False,
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    except Exception:
-        db.rollback()
-        raise
-    finally:
-        db.close()
\ No newline at end of file
+async def get_db(request: Request, response: Response):
+    async with SessionLocal() as db:
+        db.info["primary_until"] = read_your_writes_deadline(request)
+        db.info["response"] = response
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+from sqlalchemy import select
+
+from .config import settings
+from .db import PrimarySessionLocal
+from .metrics import email_filter_checks
+from .models import User
+
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(email: str) -> bytes:
+    return email.lower().strip().encode("utf-8")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` items at ``fp_rate``.
+
+    Bit positions come from one BLAKE2b digest split into two 64-bit halves
+    (Kirsch-Mitzenmacher double hashing), so a lookup hashes once.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.size = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: bytes) -> None:
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        # Re-adding a known email (create, then the next sync) is not counted
+        self.count += added
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class EmailFilter:
+    """Bloom filter of registered emails so lookups for unknown addresses
+    can skip the database.
+
+    ``might_contain`` answering False means the email was not in ``users``
+    as of the last sync; True means "query to find out". Until the first
+    build finishes, or when disabled, it always answers True. Accounts
+    created on other workers since the last sync are missing, so a False is
+    only acted on where that is safe: register skips its duplicate-check
+    SELECT and relies on the unique index, while login and OTP verification
+    always query.
+
+    The filter is built in the background at startup by paging through
+    ``users`` by id. Every ``sync_interval`` seconds rows with an id above
+    the highest one seen minus ``sync_overlap`` are added, which picks up
+    accounts created by other workers. The overlap covers auto-increment ids
+    that commit out of order: a lower id committed after a higher one is
+    still inside the re-scanned window on the next sync. Every
+    ``rebuild_interval`` seconds it is rebuilt from scratch and resized to
+    at least 1.5x the row count, so the false-positive rate holds as the
+    table grows. Accounts created in this process are added immediately.
+    """
+
+    def __init__(
+        self,
+        session_factory=PrimarySessionLocal,
+        enabled: bool = True,
+        capacity: int = 1000000,
+        fp_rate: float = 0.01,
+        sync_interval: float = 2.0,
+        rebuild_interval: float = 3600,
+        page_size: int = 5000,
+        sync_overlap: int = 1000,
+    ):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.page_size = page_size
+        self.sync_overlap = sync_overlap
+        self._filter = None
+        self._max_id = 0
+        self._building = None
+        self._task = None
+        self.builds = 0
+        self.last_build_seconds = None
+        self.last_built_at = None
+
+    def might_contain(self, email: str) -> bool:
+        if self._filter is None:
+            return True
+        if _normalize(email) in self._filter:
+            email_filter_checks.inc(result="maybe")
+            return True
+        email_filter_checks.inc(result="miss")
+        return False
+
+    def add(self, email: str) -> None:
+        item = _normalize(email)
+        if self._filter is not None:
+            self._filter.add(item)
+        if self._building is not None:
+            self._building.append(item)
+
+    async def _scan(self, target: BloomFilter, after_id: int) -> int:
+        """Add every email with id > ``after_id`` to ``target``; returns the
+        highest id seen."""
+        while True:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(User.id, User.email).filter(User.id > after_id).order_by(User.id).limit(self.page_size)
+                )
+                page = result.all()
+            for _, email in page:
+                target.add(_normalize(email))
+            if len(page) < self.page_size:
+                return page[-1][0] if page else after_id
+            after_id = page[-1][0]
+            await asyncio.sleep(0)
+
+    async def build(self) -> None:
+        started = time.perf_counter()
+        count = self._filter.count if self._filter is not None else 0
+        fresh = BloomFilter(max(self.capacity, int(count * 1.5)), self.fp_rate)
+        self._building = []
+        try:
+            max_id = await self._scan(fresh, 0)
+            for item in self._building:
+                fresh.add(item)
+        finally:
+            self._building = None
+
+        self._filter, self._max_id = fresh, max_id
+        self.builds += 1
+        self.last_build_seconds = time.perf_counter() - started
+        self.last_built_at = time.time()
+        logger.info(
+            f"Email filter built: {fresh.count} emails, {len(fresh._bits)} bytes, "
+            f"{self.last_build_seconds:.2f}s"
+        )
+
+    async def sync(self) -> None:
+        if self._filter is not None:
+            max_id = await self._scan(self._filter, max(self._max_id - self.sync_overlap, 0))
+            self._max_id = max(self._max_id, max_id)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._filter is None or time.time() - self.last_built_at >= self.rebuild_interval:
+                    await self.build()
+                else:
+                    await self.sync()
+            except Exception as e:
+                logger.error(f"Email filter refresh failed: {str(e)}")
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        return {
+            "enabled": self.enabled,
+            "ready": bloom is not None,
+            "emails": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else self.capacity,
+            "memory_bytes": len(bloom._bits) if bloom else 0,
+            "hash_count": bloom.hash_count if bloom else 0,
+            "target_fp_rate": self.fp_rate,
+            "estimated_fp_rate": round(bloom.estimated_fp_rate(), 6) if bloom else None,
+            "builds": self.builds,
+            "last_build_seconds": round(self.last_build_seconds, 3) if self.last_build_seconds is not None else None,
+            "max_user_id": self._max_id,
+        }
+
+
+email_filter = EmailFilter(
+    enabled=settings.EMAIL_FILTER_ENABLED,
+    capacity=settings.EMAIL_FILTER_CAPACITY,
+    fp_rate=settings.EMAIL_FILTER_FP_RATE,
+    sync_interval=settings.EMAIL_FILTER_SYNC_SECONDS,
+    rebuild_interval=settings.EMAIL_FILTER_REBUILD_SECONDS,
+    sync_overlap=settings.EMAIL_FILTER_SYNC_OVERLAP,
+)
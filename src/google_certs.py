@@ -0,0 +1,160 @@
+import asyncio
+import base64
+import json
+import logging
+import re
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_http = None
+_max_age_re = re.compile(r"max-age=(\d+)")
+
+
+def fetch_google_certs() -> tuple:
+    """Fetch Google's ``{kid: x509 PEM}`` map and its Cache-Control max-age."""
+    global _http
+    if _http is None:
+        # requests and google-auth are only imported once a Google sign-in needs them
+        import requests
+
+        _http = requests.Session()
+    response = _http.get(GOOGLE_OAUTH2_CERTS_URL, timeout=5)
+    response.raise_for_status()
+
+    match = _max_age_re.search(response.headers.get("Cache-Control", ""))
+    max_age = int(match.group(1)) if match else None
+    return response.json(), max_age
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class GoogleCertCache:
+    """Holds parsed Google signing certs by ``kid`` and verifies ID tokens locally.
+
+    ``fetcher`` returns ``(certs, max_age_seconds)``; the default one calls
+    Google over a shared HTTP session, tests can pass a local key set. Certs
+    are fetched in the background at startup and again once they are within
+    ``refresh_margin`` seconds of expiry, so the hot path never waits on the
+    network unless the cache is cold, expired or sees an unknown ``kid``.
+    Those fetches run in a worker thread, one at a time, so a slow response
+    from Google holds up Google sign-ins but never the event loop.
+    """
+
+    def __init__(
+        self,
+        fetcher=fetch_google_certs,
+        refresh_margin: int = 300,
+        default_ttl: int = 3600,
+        min_refetch_interval: int = 30,
+        clock_skew_seconds: int = 10,
+    ):
+        self.fetcher = fetcher
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.clock_skew_seconds = clock_skew_seconds
+        self._verifiers = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refresh_lock = asyncio.Lock()
+
+    def refresh(self) -> None:
+        from google.auth import crypt
+
+        certs, max_age = self.fetcher()
+        verifiers = {kid: crypt.RSAVerifier.from_string(cert) for kid, cert in certs.items()}
+        now = time.monotonic()
+        with self._lock:
+            self._verifiers = verifiers
+            self._fetched_at = now
+            self._expires_at = now + (max_age if max_age is not None else self.default_ttl)
+        logger.info(f"Loaded {len(verifiers)} Google signing certs (max-age {max_age})")
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Background Google cert refresh failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="google-cert-refresh", daemon=True).start()
+
+    def start(self) -> None:
+        """Fetch the certs in the background so the first sign-in finds them."""
+        self._refresh_in_background()
+
+    def _needs_refresh(self, kid: str) -> bool:
+        now = time.monotonic()
+        if now >= self._expires_at:
+            return True
+        # Google may have rotated keys before our copy expired.
+        return kid not in self._verifiers and now - self._fetched_at >= self.min_refetch_interval
+
+    async def get_verifier(self, kid: str):
+        if self._needs_refresh(kid):
+            async with self._refresh_lock:
+                # Requests that queued behind a refresh use its result
+                if self._needs_refresh(kid):
+                    await asyncio.to_thread(self.refresh)
+        elif self._expires_at - time.monotonic() <= self.refresh_margin:
+            self._refresh_in_background()
+
+        verifier = self._verifiers.get(kid)
+        if verifier is None:
+            raise ValueError(f"Unknown Google signing key: {kid}")
+        return verifier
+
+    async def verify_id_token(self, token: str, audience: str) -> dict:
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            payload = json.loads(_b64decode(payload_b64))
+            signature = _b64decode(signature_b64)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Malformed token: {str(e)}")
+
+        if header.get("alg") != "RS256":
+            raise ValueError(f"Unexpected token algorithm: {header.get('alg')}")
+
+        verifier = await self.get_verifier(header.get("kid"))
+        if not verifier.verify(f"{header_b64}.{payload_b64}".encode("utf-8"), signature):
+            raise ValueError("Invalid token signature")
+
+        now = time.time()
+        if "iat" not in payload or "exp" not in payload:
+            raise ValueError("Token is missing iat/exp")
+        if payload["iat"] - self.clock_skew_seconds > now:
+            raise ValueError("Token used too early")
+        if payload["exp"] + self.clock_skew_seconds < now:
+            raise ValueError("Token expired")
+
+        token_audience = payload.get("aud")
+        audiences = token_audience if isinstance(token_audience, list) else [token_audience]
+        if audience not in audiences:
+            raise ValueError(f"Token has wrong audience {token_audience}")
+
+        if payload.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError("wrong issuer.")
+
+        return payload
+
+
+google_cert_cache = GoogleCertCache()
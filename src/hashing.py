@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .config import settings
+from .metrics import password_hash_duration, password_hash_wait
+
+
+logger = logging.getLogger(__name__)
+
+# Calibration never goes below these, however slow the hardware.
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_MIN_TIME_COST = 2
+ARGON2_MAX_TIME_COST = 20
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when the hashing pool and its wait queue are both full."""
+
+
+# Pool workers run these module-level functions so they pickle for the
+# process executor; each returns ``(result, seconds spent)``. The hashing
+# libraries are imported on first use, in whichever process runs them.
+
+def _bcrypt_hash(password: bytes, rounds: int) -> tuple:
+    import bcrypt
+
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode("utf-8")
+    return hashed, time.perf_counter() - start
+
+
+def _bcrypt_check(password: bytes, hashed_password: str) -> tuple:
+    import bcrypt
+
+    start = time.perf_counter()
+    matches = bcrypt.checkpw(password, hashed_password.encode("utf-8"))
+    return matches, time.perf_counter() - start
+
+
+def _argon2_hash(password: bytes, time_cost: int, memory_cost: int, parallelism: int) -> tuple:
+    from argon2 import PasswordHasher
+
+    start = time.perf_counter()
+    hashed = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism).hash(password)
+    return hashed, time.perf_counter() - start
+
+
+def _argon2_check(password: bytes, hashed_password: str) -> tuple:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+
+    start = time.perf_counter()
+    try:
+        matches = PasswordHasher().verify(hashed_password, password)
+    except (VerificationError, InvalidHashError):
+        matches = False
+    return matches, time.perf_counter() - start
+
+
+class BcryptHasher:
+    name = "bcrypt"
+
+    def __init__(self, rounds: int = 12):
+        self.rounds = rounds
+
+    @staticmethod
+    def identifies(hashed_password: str) -> bool:
+        return hashed_password.startswith(("$2a$", "$2b$", "$2y$"))
+
+    def hash_call(self, password: bytes) -> tuple:
+        return _bcrypt_hash, (password, self.rounds)
+
+    def check_call(self, password: bytes, hashed_password: str) -> tuple:
+        return _bcrypt_check, (password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        # Only ever upgrade: a stored cost above a (calibrated) lower target
+        # is kept, so workers that calibrate differently don't flip-flop
+        return int(hashed_password.split("$")[2]) < self.rounds
+
+    def calibrate(self, target_ms: float) -> None:
+        """Pick the cost whose hash time is closest to ``target_ms``; each
+        extra round doubles the work."""
+        seconds = min(_bcrypt_hash(b"calibration", BCRYPT_MIN_ROUNDS)[1] for _ in range(3))
+        extra = round(math.log2(max(target_ms / 1000 / seconds, 1e-9)))
+        self.rounds = min(max(BCRYPT_MIN_ROUNDS + extra, BCRYPT_MIN_ROUNDS), BCRYPT_MAX_ROUNDS)
+
+    def describe(self) -> dict:
+        return {"scheme": self.name, "rounds": self.rounds}
+
+
+class Argon2Hasher:
+    name = "argon2id"
+
+    def __init__(self, time_cost: int = 3, memory_cost: int = 65536, parallelism: int = 1):
+        try:
+            import argon2  # noqa: F401
+        except ImportError:
+            raise RuntimeError("PASSWORD_HASH_SCHEME=argon2id requires the 'argon2-cffi' package")
+
+        self.time_cost = time_cost
+        self.memory_cost = memory_cost
+        self.parallelism = parallelism
+
+    @staticmethod
+    def identifies(hashed_password: str) -> bool:
+        return hashed_password.startswith("$argon2id$")
+
+    def hash_call(self, password: bytes) -> tuple:
+        return _argon2_hash, (password, self.time_cost, self.memory_cost, self.parallelism)
+
+    def check_call(self, password: bytes, hashed_password: str) -> tuple:
+        return _argon2_check, (password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        from argon2 import extract_parameters
+
+        # As for bcrypt, only a weaker stored cost triggers a rehash
+        stored = extract_parameters(hashed_password)
+        return stored.time_cost < self.time_cost or stored.memory_cost < self.memory_cost
+
+    def calibrate(self, target_ms: float) -> None:
+        """Keep ``memory_cost`` and scale ``time_cost`` (passes over memory,
+        roughly linear in time) to land near ``target_ms``."""
+        seconds = min(_argon2_hash(b"calibration", 1, self.memory_cost, self.parallelism)[1] for _ in range(3))
+        time_cost = round(target_ms / 1000 / seconds)
+        self.time_cost = min(max(time_cost, ARGON2_MIN_TIME_COST), ARGON2_MAX_TIME_COST)
+
+    def describe(self) -> dict:
+        return {
+            "scheme": self.name,
+            "time_cost": self.time_cost,
+            "memory_kib": self.memory_cost,
+            "parallelism": self.parallelism,
+        }
+
+
+def create_password_scheme():
+    if settings.PASSWORD_HASH_SCHEME == "argon2id":
+        return Argon2Hasher(settings.ARGON2_TIME_COST, settings.ARGON2_MEMORY_KIB, settings.ARGON2_PARALLELISM)
+    if settings.PASSWORD_HASH_SCHEME == "bcrypt":
+        return BcryptHasher(settings.BCRYPT_ROUNDS)
+    raise ValueError(f"Unknown password hash scheme: {settings.PASSWORD_HASH_SCHEME}")
+
+
+class HashingStats:
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, hash_seconds: float) -> None:
+        self.completed += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+        self.hash_seconds_total += hash_seconds
+        self.hash_seconds_max = max(self.hash_seconds_max, hash_seconds)
+
+    def as_dict(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(self.wait_seconds_total / completed * 1000, 3),
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            "hash_ms_avg": round(self.hash_seconds_total / completed * 1000, 3),
+            "hash_ms_max": round(self.hash_seconds_max * 1000, 3),
+        }
+
+
+class PasswordHashingService:
+    """Runs password hashing on a bounded worker pool so it never blocks the
+    event loop.
+
+    At most ``max_workers`` hashes run at once and at most ``queue_depth``
+    more may wait for a worker; anything beyond that is rejected with
+    ``HashingPoolSaturated`` instead of piling up behind the pool.
+
+    New hashes use ``scheme``; stored bcrypt and argon2id hashes are both
+    verified, and ``needs_rehash`` tells the caller when one should be
+    replaced by a hash in the current scheme and cost.
+    """
+
+    def __init__(self, executor_kind: str = "thread", max_workers: int = 4, queue_depth: int = 32, scheme=None):
+        if executor_kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor_kind}")
+
+        self.scheme = scheme or BcryptHasher()
+        self.executor_kind = executor_kind
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.in_flight = 0
+        self.stats = HashingStats()
+        self._executor: Executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash",
+                )
+        return self._executor
+
+    async def _submit(self, operation: str, func, *args):
+        if self.in_flight >= self.max_workers + self.queue_depth:
+            self.stats.rejected += 1
+            logger.warning(f"Password hashing pool saturated ({self.in_flight} in flight)")
+            raise HashingPoolSaturated()
+
+        self.in_flight += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, hash_seconds = await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+
+        wait_seconds = max(time.perf_counter() - submitted - hash_seconds, 0.0)
+        self.stats.record(wait_seconds, hash_seconds)
+        password_hash_duration.observe(hash_seconds, operation=operation)
+        password_hash_wait.observe(wait_seconds, operation=operation)
+        return result
+
+    def _scheme_for(self, hashed_password: str):
+        if self.scheme.identifies(hashed_password):
+            return self.scheme
+        if BcryptHasher.identifies(hashed_password):
+            return BcryptHasher()
+        if Argon2Hasher.identifies(hashed_password):
+            return Argon2Hasher()
+        raise ValueError("Unrecognised password hash format")
+
+    async def hash_password(self, password: str) -> str:
+        func, args = self.scheme.hash_call(password.encode("utf-8"))
+        return await self._submit("hash", func, *args)
+
+    async def check_password(self, password: str, hashed_password: str) -> bool:
+        func, args = self._scheme_for(hashed_password).check_call(password.encode("utf-8"), hashed_password)
+        return await self._submit("check", func, *args)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return not self.scheme.identifies(hashed_password) or self.scheme.needs_rehash(hashed_password)
+
+    async def calibrate(self, target_ms: float) -> None:
+        """Tune the scheme's cost so one hash takes about ``target_ms`` on
+        this machine; runs off the event loop."""
+        started = time.perf_counter()
+        await asyncio.to_thread(self.scheme.calibrate, target_ms)
+        logger.info(
+            f"Calibrated password hashing to {self.scheme.describe()} for {target_ms:.0f} ms "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            **self.scheme.describe(),
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            **self.stats.as_dict(),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHashingService(
+    executor_kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    queue_depth=settings.PASSWORD_HASH_QUEUE_DEPTH,
+    scheme=create_password_scheme(),
+)
@@ -0,0 +1,261 @@
+"""Asymmetric JWT signing keys.
+
+Keys live in ``JWT_KEYS_DIR`` as ``<kid>.pem`` (EC P-256 private keys) with
+an ``active`` file naming the kid that signs new tokens. Every other key in
+the directory verifies tokens and is published on ``/.well-known/jwks.json``:
+a *staged* key before it is activated, a *retiring* one until it is retired.
+
+Running workers re-read the directory when it changes (checked every
+``JWT_KEYS_RELOAD_SECONDS``), so rotation needs no restart. A new key is
+staged first and only activated once every worker and every verifier
+holding a cached JWKS (``JWKS_MAX_AGE``) has seen it; ``activate`` refuses
+to do it sooner::
+
+    python -m src.keys stage --dir keys/             # publish a new key
+    python -m src.keys activate NEW_KID --dir keys/  # >= JWKS max-age later
+    python -m src.keys list --dir keys/
+    python -m src.keys retire OLD_KID --dir keys/    # after tokens it signed expire
+"""
+import argparse
+import logging
+import os
+import secrets
+import time
+from pathlib import Path
+
+from .config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "ES256"
+ACTIVE_FILE = "active"
+# Cache-Control max-age of /.well-known/jwks.json
+JWKS_MAX_AGE = 300
+
+
+class InvalidTokenError(Exception):
+    """A JWT that failed to decode or verify."""
+
+# python-jose pulls in cryptography's x509 stack (~30 ms); it is imported by
+# the functions below on first use instead of when the app is imported.
+
+
+class KeyRing:
+    """Active plus retiring signing keys, pre-parsed so the hot path never
+    touches PEM."""
+
+    def __init__(self, private_keys: dict, active_kid: str):
+        if active_kid not in private_keys:
+            raise ValueError(f"Active key {active_kid} is not in the key ring")
+
+        from jose import jwk
+
+        self.active_kid = active_kid
+        self._signers = {}
+        self._verifiers = {}
+        for kid, pem in private_keys.items():
+            self._signers[kid] = jwk.construct(pem, ALGORITHM)
+            self._verifiers[kid] = self._signers[kid].public_key()
+
+    @classmethod
+    def from_directory(cls, path: str) -> "KeyRing":
+        directory = Path(path)
+        private_keys = {pem.stem: pem.read_text() for pem in sorted(directory.glob("*.pem"))}
+        active_kid = (directory / ACTIVE_FILE).read_text().strip()
+        return cls(private_keys, active_kid)
+
+    @property
+    def kids(self) -> list:
+        return list(self._verifiers)
+
+    def sign(self, claims: dict) -> str:
+        from jose import jwt
+
+        return jwt.encode(
+            claims,
+            self._signers[self.active_kid],
+            algorithm=ALGORITHM,
+            headers={"kid": self.active_kid},
+        )
+
+    def decode(self, token: str) -> dict:
+        from jose import jwt
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._verifiers.get(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key: {kid}")
+        return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+    def jwks(self) -> dict:
+        keys = []
+        for kid, key in self._verifiers.items():
+            public_jwk = key.to_dict()
+            public_jwk.update({"kid": kid, "use": "sig", "alg": ALGORITHM})
+            keys.append(public_jwk)
+        return {"keys": keys}
+
+
+def generate_private_key() -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("utf-8")
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # Reloading workers must never see a half-written key or kid
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(text)
+    temporary.chmod(0o600)
+    os.replace(temporary, path)
+
+
+def stage(path: str) -> str:
+    """Write a new, published but inactive key and return its kid. The
+    first key in an empty directory is activated straight away."""
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    kid = secrets.token_hex(8)
+    _write_atomic(directory / f"{kid}.pem", generate_private_key())
+    if not (directory / ACTIVE_FILE).exists():
+        _write_atomic(directory / ACTIVE_FILE, kid)
+    return kid
+
+
+def activation_delay() -> float:
+    """How long a staged key must have been published before it may sign."""
+    return JWKS_MAX_AGE + settings.JWT_KEYS_RELOAD_SECONDS
+
+
+def activate(path: str, kid: str, force: bool = False) -> None:
+    directory = Path(path)
+    pem_path = directory / f"{kid}.pem"
+    if not pem_path.exists():
+        raise ValueError(f"No staged key {kid} in {directory}")
+    age = time.time() - pem_path.stat().st_mtime
+    if age < activation_delay() and not force:
+        raise ValueError(
+            f"Key {kid} was staged {age:.0f}s ago; wait {activation_delay() - age:.0f}s more so every "
+            f"worker and cached JWKS has it, or pass --force"
+        )
+    _write_atomic(directory / ACTIVE_FILE, kid)
+
+
+def retire(path: str, kid: str) -> None:
+    directory = Path(path)
+    if (directory / ACTIVE_FILE).read_text().strip() == kid:
+        raise ValueError("Refusing to retire the active key; activate another one first")
+    (directory / f"{kid}.pem").unlink()
+
+
+class KeyRingLoader:
+    """The current ``KeyRing`` for ``directory``, reloaded when its files
+    change. The check is a directory listing at most every ``interval``
+    seconds; a reload that fails keeps the previous ring."""
+
+    def __init__(self, directory: str, interval: float = 10.0):
+        self.directory = Path(directory) if directory else None
+        self.interval = interval
+        self._ring = None
+        self._signature = None
+        self._checked_at = None
+        self.reloads = 0
+
+    def _current_signature(self) -> tuple:
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in self.directory.iterdir()
+            if entry.suffix == ".pem" or entry.name == ACTIVE_FILE
+        ))
+
+    def get(self):
+        if self.directory is None:
+            return None
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.interval:
+            return self._ring
+        self._checked_at = now
+        try:
+            signature = self._current_signature()
+            if signature != self._signature:
+                self._ring = KeyRing.from_directory(self.directory)
+                self._signature = signature
+                self.reloads += 1
+                logger.info(f"Loaded JWT key ring from {self.directory}: active {self._ring.active_kid}, kids {self._ring.kids}")
+        except Exception as e:
+            if self._ring is None:
+                raise
+            logger.error(f"Keeping the previous JWT key ring; reloading {self.directory} failed: {str(e)}")
+        return self._ring
+
+
+key_ring_loader = KeyRingLoader(settings.JWT_KEYS_DIR, settings.JWT_KEYS_RELOAD_SECONDS)
+
+
+def get_key_ring():
+    """The current key ring, or None when tokens are signed with SECRET_KEY."""
+    return key_ring_loader.get()
+
+
+def encode_jwt(claims: dict) -> str:
+    key_ring = get_key_ring()
+    if key_ring is not None:
+        return key_ring.sign(claims)
+    from jose import jwt
+
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def decode_jwt(token: str) -> dict:
+    """Raises ``InvalidTokenError`` for malformed, forged or expired tokens."""
+    from jose import JWTError, jwt
+
+    try:
+        key_ring = get_key_ring()
+        if key_ring is not None:
+            return key_ring.decode(token)
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise InvalidTokenError(str(e)) from e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys")
+    parser.add_argument("command", choices=["stage", "activate", "list", "retire"])
+    parser.add_argument("kid", nargs="?")
+    parser.add_argument("--dir", default=settings.JWT_KEYS_DIR or "keys")
+    parser.add_argument("--force", action="store_true", help="activate without waiting for the JWKS max-age")
+    args = parser.parse_args()
+
+    if args.command == "stage":
+        kid = stage(args.dir)
+        if (Path(args.dir) / ACTIVE_FILE).read_text().strip() == kid:
+            print(f"New active key: {kid}")
+        else:
+            print(f"Staged key: {kid}; activate it in {activation_delay():.0f}s or later")
+    elif args.command in ("activate", "retire"):
+        if not args.kid:
+            parser.error(f"{args.command} needs a kid")
+        try:
+            if args.command == "activate":
+                activate(args.dir, args.kid, args.force)
+            else:
+                retire(args.dir, args.kid)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"{'Activated' if args.command == 'activate' else 'Retired'} key: {args.kid}")
+    else:
+        ring = KeyRing.from_directory(args.dir)
+        for kid in ring.kids:
+            print(f"{kid}{'  (active)' if kid == ring.active_kid else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from .config import settings
+from .crud import claim_mail_batch
+from .db import PrimarySessionLocal
+from .metrics import mail_messages, otp_events
+from .utils import smtp_pool, build_message
+
+
+logger = logging.getLogger(__name__)
+
+
+class MailDispatcher:
+    """Drains the ``mail_outbox`` table in batches over the SMTP pool.
+
+    Delivery is at-least-once: a batch that fails part-way is retried as a
+    whole. Failed rows back off exponentially and are moved to ``dead``
+    after ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        session_factory=PrimarySessionLocal,
+        pool=smtp_pool,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        max_attempts: int = 6,
+        retry_base_seconds: int = 5,
+        retry_max_seconds: int = 600,
+    ):
+        self.session_factory = session_factory
+        self.pool = pool
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._wakeup = None
+        self._task = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the dispatcher early, e.g. right after an OTP was queued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Mail dispatcher error: {type(e).__name__}: {str(e)}")
+                processed = 0
+
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        seconds = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        return timedelta(seconds=seconds)
+
+    def _record_failure(self, mail, error: Exception) -> None:
+        mail.attempts += 1
+        mail.last_error = f"{type(error).__name__}: {str(error)}"[:500]
+        if mail.attempts >= self.max_attempts:
+            mail.status = "dead"
+            # Dead rows are kept for inspection, but not the OTP they carried
+            mail.body = None
+            mail_messages.inc(kind=mail.kind, result="dead")
+            logger.error(f"Mail {mail.id} to {mail.recipient} dead-lettered after {mail.attempts} attempts")
+        else:
+            mail.next_attempt_at = datetime.utcnow() + self._retry_delay(mail.attempts)
+            mail_messages.inc(kind=mail.kind, result="retry")
+            logger.warning(f"Mail {mail.id} to {mail.recipient} failed, retry {mail.attempts}/{self.max_attempts}")
+
+    async def drain_once(self) -> int:
+        """Deliver one batch of due mail and return how many rows it held."""
+        async with self.session_factory() as db:
+            batch = await claim_mail_batch(db, self.batch_size)
+            if not batch:
+                await db.commit()
+                return 0
+
+            messages = [build_message(mail.recipient, mail.subject, mail.body) for mail in batch]
+            try:
+                sent = await asyncio.to_thread(self.pool.send_many, messages)
+                failures = {id(message): error for message, error in sent}
+            except Exception as e:
+                failures = {id(message): e for message in messages}
+
+            now = datetime.utcnow()
+            for mail, message in zip(batch, messages):
+                error = failures.get(id(message))
+                if error is not None:
+                    self._record_failure(mail, error)
+                else:
+                    mail.status = "sent"
+                    mail.sent_at = now
+                    mail.body = None
+                    mail_messages.inc(kind=mail.kind, result="sent")
+                    if mail.kind == "otp":
+                        otp_events.inc(event="sent")
+
+            await db.commit()
+            logger.info(f"Mail dispatcher delivered {len(batch) - len(failures)}/{len(batch)} messages")
+            return len(batch)
+
+
+mail_dispatcher = MailDispatcher(
+    batch_size=settings.MAIL_BATCH_SIZE,
+    poll_interval=settings.MAIL_POLL_INTERVAL,
+    max_attempts=settings.MAIL_MAX_ATTEMPTS,
+    retry_base_seconds=settings.MAIL_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.MAIL_RETRY_MAX_SECONDS,
+)
@@ -1,22 +1,65 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+import logging
 from contextlib import asynccontextmanager
 from .models import BaseModel
-from .db import engine
+from .db import engine, replica_set, warm_pools
 from .router import router
+from .hashing import password_hasher, HashingPoolSaturated
+from .bulk_users import import_hasher
+from .utils import smtp_pool
+from .mail_queue import mail_dispatcher
+from .otp_store import otp_store
+from .ratelimit import rate_limiter
+from .refresh_tokens import refresh_token_repo
+from .reaper import token_reaper
+from .email_filter import email_filter
+from .config import settings, ENV_FILE, SETTINGS_WARNINGS
+from .keys import get_key_ring
+from .google_certs import google_cert_cache
+from .metrics import MetricsMiddleware
+
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Creating database tables...")
-    BaseModel.metadata.create_all(bind=engine)
-    print("Database initialized")
+    logger.info(f"Settings loaded from {ENV_FILE or 'the environment (no .env file found)'}")
+    for warning in SETTINGS_WARNINGS:
+        logger.warning(warning)
+    # Fail now rather than on the first request if JWT_KEYS_DIR is unusable
+    get_key_ring()
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+    if settings.DB_POOL_WARM_CONNECTIONS:
+        await warm_pools(settings.DB_POOL_WARM_CONNECTIONS)
+    if settings.PASSWORD_HASH_TARGET_MS:
+        await password_hasher.calibrate(settings.PASSWORD_HASH_TARGET_MS)
+    replica_set.start()
+    if settings.GOOGLE_CLIENT_ID:
+        google_cert_cache.start()
+    email_filter.start()
+    mail_dispatcher.start()
+    refresh_token_repo.start()
+    if settings.REAPER_ENABLED:
+        token_reaper.start()
 
     yield
-    print("Closing database connections...")
-    engine.dispose()
-    print("Shutdown complete")
+    await token_reaper.stop()
+    await email_filter.stop()
+    await mail_dispatcher.stop()
+    await refresh_token_repo.stop()
+    await engine.dispose()
+    await replica_set.close()
+    password_hasher.shutdown()
+    import_hasher.shutdown()
+    smtp_pool.close()
+    await otp_store.close()
+    await rate_limiter.close()
+    logger.info("Shutdown complete")
 
 app = FastAPI(
     title="User Authentication API",
@@ -41,5 +84,15 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please try again shortly"},
+        headers={"Retry-After": "1"},
+    )
 
 app.include_router(router)
\ No newline at end of file
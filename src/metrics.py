@@ -0,0 +1,239 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Metrics are plain counters and fixed-bucket histograms kept in memory;
+``/metrics`` only formats them, so a scrape never touches the database.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; per-bucket counts are made cumulative only
+    when rendered, so ``observe`` is one bisect and two additions."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+otp_events = registry.counter(
+    "otp_events_total", "OTPs sent, verified, failed, expired or locked.", ("event",)
+)
+email_filter_checks = registry.counter(
+    "email_filter_checks_total", "Email filter lookups: definite misses and possible hits.", ("result",)
+)
+rate_limited = registry.counter(
+    "rate_limited_total", "Requests rejected by the rate limiter.", ("rule", "scope")
+)
+password_hash_duration = registry.histogram(
+    "password_hash_duration_seconds", "Time spent hashing or checking passwords.", ("operation",)
+)
+password_hash_wait = registry.histogram(
+    "password_hash_wait_seconds", "Time spent waiting for a hashing worker.", ("operation",)
+)
+smtp_send_duration = registry.histogram(
+    "smtp_send_duration_seconds", "Time to hand one message to the SMTP server."
+)
+mail_messages = registry.counter(
+    "mail_messages_total", "Outbox messages by kind and delivery result.", ("kind", "result")
+)
+token_reaper_runs = registry.counter(
+    "token_reaper_runs_total", "Refresh token reaper runs by result.", ("result",)
+)
+token_reaper_rows = registry.counter(
+    "token_reaper_rows_deleted_total", "Expired and revoked refresh tokens deleted by the reaper."
+)
+token_reaper_duration = registry.histogram(
+    "token_reaper_run_duration_seconds", "Time for one reaper run, all chunks included.",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+db_queries = registry.counter("db_queries_total", "SQL statements executed.")
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement latency.")
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), buckets=COUNT_BUCKETS
+)
+db_time_per_request = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per HTTP request.", ("route",)
+)
+db_routed_statements = registry.counter(
+    "db_routed_statements_total", "Session statements by the engine they were sent to.", ("target",)
+)
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time to check a connection out of the pool."
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def instrument_engine(sync_engine) -> None:
+    """Time every statement on ``sync_engine`` and attribute it to the
+    current request, if any."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        db_queries.inc()
+        db_query_duration.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL usage per route.
+
+    Requests are labelled by route template (``/auth/me``), never by raw
+    path, so unmatched URLs cannot blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method=method, route=route_path, status=str(status_code))
+            http_request_duration.observe(elapsed, method=method, route=route_path)
+            db_queries_per_request.observe(stats.queries, route=route_path)
+            db_time_per_request.observe(stats.db_seconds, route=route_path)
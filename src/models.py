@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
@@ -24,9 +24,11 @@ class User(BaseModel):
     oauth_id = Column(String(255), nullable=True)
     profile_picture = Column(String(500), nullable=True)
     is_verified = Column(Boolean, default=False)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
-    otp = Column(String(6), nullable=True)
-    otp_expires_at = Column(DateTime, nullable=False)
+    # Only written by the "database" OTP store backend (see otp_store.py).
+    otp = Column(String(128), nullable=True)
+    otp_expires_at = Column(DateTime, nullable=True)
     otp_attempts = Column(Integer, default=0)
     user_created_time = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
@@ -42,11 +44,51 @@ class RefreshToken(BaseModel):
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     revoked = Column(Boolean, default=False)
+    revoked_at = Column(DateTime, nullable=True)
+    # Client that started the session; carried over when the token is rotated
+    device = Column(String(100), nullable=True)
+    ip_address = Column(String(45), nullable=True)
+    user_agent = Column(String(500), nullable=True)
+    last_used_at = Column(DateTime, nullable=True)
+    # Sign-in time, also carried over; created_at is when this token was issued
+    session_started_at = Column(DateTime, nullable=True)
 
     user = relationship(
         "User",
         back_populates="refresh_tokens"
     )
 
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_revoked_expires_at", "user_id", "revoked", "expires_at"),
+        Index("ix_refresh_tokens_user_id_created_at", "user_id", "created_at"),
+    )
+
+    @property
+    def started_at(self):
+        """Rows written before ``session_started_at`` existed fall back to ``created_at``."""
+        return self.session_started_at or self.created_at
+
+    def __repr__(self):
+        return f"<RefreshToken(id='{self.id}', user_id='{self.user_id}', revoked='{self.revoked}')>"
+
+class MailOutbox(BaseModel):
+    __tablename__ = "mail_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String(255), index=True, nullable=False)
+    kind = Column(String(50), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=True)
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_mail_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
     def __repr__(self):
-        return f"<RefreshToken(id='{self.id}', user_id='{self.user_id}', revoked='{self.revoked}')>"
\ No newline at end of file
+        return f"<MailOutbox(id='{self.id}', recipient='{self.recipient}', status='{self.status}')>"
\ No newline at end of file
@@ -0,0 +1,247 @@
+import hashlib
+import heapq
+import hmac
+import secrets
+import time
+from datetime import datetime, timedelta
+from abc import ABC, abstractmethod
+from enum import Enum
+
+from . import crud
+from .config import settings
+from .db import PrimarySessionLocal
+
+
+OTP_SALT_BYTES = 16
+
+# Shared stores need the same key on every worker, which settings.validate()
+# enforces; only the in-memory store may fall back to a per-process key.
+_otp_key = (settings.OTP_HMAC_KEY or settings.SECRET_KEY or secrets.token_hex(32)).encode("utf-8")
+
+
+def hash_otp(otp: str) -> str:
+    """``<salt>$<HMAC-SHA256(key, salt + otp)>`` in hex, with a fresh salt per issue.
+
+    An HMAC rather than bcrypt: the code is short-lived and attempt-limited,
+    so the store needs a keyed digest that costs microseconds, not a slow hash.
+    """
+    salt = secrets.token_bytes(OTP_SALT_BYTES)
+    digest = hmac.new(_otp_key, salt + str(otp).encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{salt.hex()}${digest}"
+
+
+def check_otp(provided_otp: str, otp_hash: str) -> bool:
+    salt_hex, _, expected = otp_hash.partition("$")
+    try:
+        salt = bytes.fromhex(salt_hex)
+    except ValueError:
+        return False
+    digest = hmac.new(_otp_key, salt + str(provided_otp).encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(digest, expected)
+
+
+class OTPStatus(str, Enum):
+    VALID = "valid"
+    INVALID = "invalid"
+    EXPIRED = "expired"
+    LOCKED = "locked"
+
+
+class OTPStore(ABC):
+    """Holds pending OTPs, only ever as ``hash_otp`` digests.
+
+    ``verify`` must check the code, count the attempt and consume the OTP as
+    one atomic step so concurrent guesses cannot both succeed.
+    """
+
+    @abstractmethod
+    async def save(self, email: str, otp: str, ttl_seconds: int) -> None:
+        ...
+
+    @abstractmethod
+    async def verify(self, email: str, provided_otp: str, max_attempts: int) -> OTPStatus:
+        ...
+
+    @abstractmethod
+    async def discard(self, email: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryOTPStore(OTPStore):
+    """Per-process store: a dict of live OTPs plus a heap ordered by expiry.
+
+    None of the methods await, so each runs atomically on the event loop.
+    Only suitable for a single worker process.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._expiry_heap = []
+
+    def _evict_expired(self, now: float) -> None:
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, email = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(email)
+            # Skip heap items left behind when an OTP was re-issued.
+            if entry is not None and entry["expires_at"] == expires_at:
+                del self._entries[email]
+
+    async def save(self, email: str, otp: str, ttl_seconds: int) -> None:
+        now = time.monotonic()
+        self._evict_expired(now)
+        expires_at = now + ttl_seconds
+        self._entries[email] = {"otp_hash": hash_otp(otp), "expires_at": expires_at, "attempts": 0}
+        heapq.heappush(self._expiry_heap, (expires_at, email))
+
+    async def verify(self, email: str, provided_otp: str, max_attempts: int) -> OTPStatus:
+        self._evict_expired(time.monotonic())
+        entry = self._entries.get(email)
+        if entry is None:
+            return OTPStatus.EXPIRED
+
+        if entry["attempts"] >= max_attempts:
+            del self._entries[email]
+            return OTPStatus.LOCKED
+
+        if not check_otp(provided_otp, entry["otp_hash"]):
+            entry["attempts"] += 1
+            if entry["attempts"] >= max_attempts:
+                del self._entries[email]
+            return OTPStatus.INVALID
+
+        del self._entries[email]
+        return OTPStatus.VALID
+
+    async def discard(self, email: str) -> None:
+        self._entries.pop(email, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_REDIS_VERIFY_SCRIPT = """
+local otp_hash = redis.call('HGET', KEYS[1], 'otp_hash')
+if not otp_hash or otp_hash ~= ARGV[1] then
+    return 'expired'
+end
+local max_attempts = tonumber(ARGV[3])
+local attempts = tonumber(redis.call('HGET', KEYS[1], 'attempts') or '0')
+if attempts >= max_attempts then
+    redis.call('DEL', KEYS[1])
+    return 'locked'
+end
+if ARGV[2] == '1' then
+    redis.call('DEL', KEYS[1])
+    return 'valid'
+end
+attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= max_attempts then
+    redis.call('DEL', KEYS[1])
+end
+return 'invalid'
+"""
+
+
+class RedisOTPStore(OTPStore):
+    """Shared store for multi-worker deployments.
+
+    Each OTP is a hash with a native Redis TTL. Verification reads the
+    digest, checks it locally with ``compare_digest``, then applies the
+    outcome in a Lua script that only acts if the digest it was checked
+    against is still current, so the consume or attempt count is atomic.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "otp:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("OTP_STORE_BACKEND=redis requires the 'redis' package")
+
+        self.key_prefix = key_prefix
+        self._client = redis.from_url(url, decode_responses=True)
+        self._verify_script = self._client.register_script(_REDIS_VERIFY_SCRIPT)
+
+    def _key(self, email: str) -> str:
+        return f"{self.key_prefix}{email}"
+
+    async def save(self, email: str, otp: str, ttl_seconds: int) -> None:
+        key = self._key(email)
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={"otp_hash": hash_otp(otp), "attempts": 0})
+            pipe.expire(key, ttl_seconds)
+            await pipe.execute()
+
+    async def verify(self, email: str, provided_otp: str, max_attempts: int) -> OTPStatus:
+        key = self._key(email)
+        otp_hash = await self._client.hget(key, "otp_hash")
+        if otp_hash is None:
+            return OTPStatus.EXPIRED
+
+        matches = "1" if check_otp(provided_otp, otp_hash) else "0"
+        result = await self._verify_script(keys=[key], args=[otp_hash, matches, max_attempts])
+        return OTPStatus(result)
+
+    async def discard(self, email: str) -> None:
+        await self._client.delete(self._key(email))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class DatabaseOTPStore(OTPStore):
+    """Shared store on the ``users`` OTP columns, for multi-worker
+    deployments without Redis.
+
+    The digest is read and checked locally, then the outcome is applied by
+    one conditional UPDATE keyed on that digest (consume it, or count a
+    failed attempt), so the row lock rather than application code decides
+    which concurrent submission wins.
+    """
+
+    def __init__(self, session_factory=PrimarySessionLocal):
+        self.session_factory = session_factory
+
+    async def save(self, email: str, otp: str, ttl_seconds: int) -> None:
+        async with self.session_factory() as db:
+            await crud.save_otp(db, email, hash_otp(otp), datetime.utcnow() + timedelta(seconds=ttl_seconds))
+
+    async def verify(self, email: str, provided_otp: str, max_attempts: int) -> OTPStatus:
+        async with self.session_factory() as db:
+            state = await crud.get_otp_state(db, email)
+            if state is None or state.otp is None or state.otp_expires_at <= datetime.utcnow():
+                return OTPStatus.EXPIRED
+
+            if state.otp_attempts >= max_attempts:
+                await crud.clear_otp(db, email)
+                return OTPStatus.LOCKED
+
+            # A zero rowcount means a concurrent request consumed, locked or
+            # re-issued this OTP after we read it.
+            if check_otp(provided_otp, state.otp):
+                if await crud.consume_otp(db, email, state.otp, max_attempts):
+                    return OTPStatus.VALID
+                return OTPStatus.EXPIRED
+            if await crud.record_otp_failure(db, email, state.otp, max_attempts):
+                return OTPStatus.INVALID
+            return OTPStatus.EXPIRED
+
+    async def discard(self, email: str) -> None:
+        async with self.session_factory() as db:
+            await crud.clear_otp(db, email)
+
+
+def create_otp_store() -> OTPStore:
+    if settings.OTP_STORE_BACKEND == "redis":
+        return RedisOTPStore(settings.REDIS_URL)
+    if settings.OTP_STORE_BACKEND == "database":
+        return DatabaseOTPStore()
+    if settings.OTP_STORE_BACKEND == "memory":
+        return InMemoryOTPStore()
+    raise ValueError(f"Unknown OTP store backend: {settings.OTP_STORE_BACKEND}")
+
+
+otp_store = create_otp_store()
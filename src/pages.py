@@ -0,0 +1,169 @@
+"""Landing page and static assets, rendered and compressed once per process.
+
+The landing page's only template variable, ``GOOGLE_CLIENT_ID``, is fixed
+for the life of the process, so ``index.html`` is rendered on the first
+request and kept together with its gzip and brotli encodings (``Brotli``
+is in requirements.txt; without it only gzip is offered) and a strong ETag.
+A request then costs a dict lookup, or a 304 when ``If-None-Match`` matches.
+
+Files under ``static/`` are cached the same way. Pages link them through
+``static_url()``, which appends a content hash (``/static/app.js?v=...``),
+so a versioned URL never changes meaning and can be cached for a year.
+"""
+import gzip
+import hashlib
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+
+from fastapi import Request, Response
+
+from .config import settings
+
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+STATIC_URL = "/static"
+# Below this the compressed body and headers are not worth it
+MIN_COMPRESS_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    """Jinja2 is only imported when the first page is rendered."""
+    from jinja2 import Environment, FileSystemLoader
+
+    return Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), autoescape=True)
+
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps the output, and so the ETag, identical across processes
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def _brotli(body: bytes):
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(body, quality=11)
+
+
+# Preferred first
+ENCODERS = (("br", _brotli), ("gzip", _gzip))
+
+
+def accepted_encodings(header: str) -> dict:
+    """``"gzip, br;q=0.5"`` -> ``{"gzip": 1.0, "br": 0.5}``."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class CachedAsset:
+    """An immutable body with its precompressed variants and their ETags."""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.media_type = media_type
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            for coding, encode in ENCODERS:
+                encoded = encode(body)
+                if encoded is not None and len(encoded) < len(body):
+                    self.variants[coding] = encoded
+        # Each encoding is different bytes, so each gets its own strong ETag
+        self.etags = {
+            coding: f'"{self.version}"' if coding == "identity" else f'"{self.version}-{coding}"'
+            for coding in self.variants
+        }
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        accepted = accepted_encodings(accept_encoding)
+        for coding, _ in ENCODERS:
+            if coding in self.variants and accepted.get(coding, accepted.get("*", 0)) > 0:
+                return coding
+        return "identity"
+
+    def not_modified(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        # If-None-Match uses weak comparison, so a W/ prefix still matches
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or not tags.isdisjoint(self.etags.values())
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        coding = self.choose_encoding(request.headers.get("accept-encoding", ""))
+        headers = {"ETag": self.etags[coding], "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if self.not_modified(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(self.variants[coding], media_type=self.media_type, headers=headers)
+
+
+class StaticAssets:
+    """Files under ``directory``, loaded and compressed on first request."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory.resolve()
+        self._assets = {}
+
+    def get(self, name: str):
+        asset = self._assets.get(name)
+        if asset is None:
+            path = (self.directory / name).resolve()
+            if not path.is_relative_to(self.directory) or not path.is_file():
+                return None
+            media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            asset = self._assets.setdefault(name, CachedAsset(path.read_bytes(), media_type))
+        return asset
+
+    def url(self, name: str) -> str:
+        asset = self.get(name)
+        if asset is None:
+            raise ValueError(f"Unknown static asset: {name}")
+        return f"{STATIC_URL}/{name}?v={asset.version}"
+
+    def cache_control(self, asset: CachedAsset, version: str) -> str:
+        """Versioned URLs are immutable; anything else revalidates by ETag."""
+        if version == asset.version:
+            return f"public, max-age={settings.STATIC_MAX_AGE_SECONDS}, immutable"
+        return "no-cache"
+
+
+class LandingPage:
+    """``index.html`` rendered once; settings are fixed for the process."""
+
+    def __init__(self, assets: StaticAssets, template: str = "index.html"):
+        self.assets = assets
+        self.template = template
+        self._page = None
+
+    def render(self) -> str:
+        return get_templates().get_template(self.template).render(
+            google_client_id=settings.GOOGLE_CLIENT_ID or "",
+            static_url=self.assets.url,
+        )
+
+    def get(self) -> CachedAsset:
+        if self._page is None:
+            self._page = CachedAsset(self.render().encode("utf-8"), "text/html")
+        return self._page
+
+
+static_assets = StaticAssets(STATIC_DIR)
+landing_page = LandingPage(static_assets)
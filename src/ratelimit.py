@@ -0,0 +1,205 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+from .config import settings
+from .metrics import rate_limited
+
+
+def parse_rate(rate: str) -> tuple:
+    """``"20/60"`` -> ``(20, 60)``: 20 requests per 60 seconds."""
+    count, seconds = rate.split("/")
+    return int(count), int(seconds)
+
+
+def _retry_after(now: float, window_start: float, window: int, limit: int, previous: int, current: int) -> float:
+    """Seconds until the sliding-window estimate drops below ``limit``."""
+    if current >= limit or previous == 0:
+        return window_start + window - now
+    return window_start + window * (1 - (limit - current) / previous) - now
+
+
+class RateLimiter(ABC):
+    """Sliding-window counters keyed by arbitrary strings.
+
+    Each key keeps the hit count of the current and previous fixed window;
+    the previous window is weighted by how much of it still overlaps the
+    sliding window. That is O(1) state per key and close to an exact log.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
+        """Count one request for ``key``; returns ``(allowed, retry_after)``.
+
+        Rejected requests are not counted, so a client that backs off
+        recovers on schedule.
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """Per-process limiter; at most ``max_keys`` keys are tracked and the
+    least recently seen are dropped first."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
+        now = time.time()
+        window_start = now - now % window
+        entry = self._windows.get(key)
+
+        if entry is None or entry[0] < window_start - window:
+            entry = [window_start, 0, 0]
+        elif entry[0] < window_start:
+            entry = [window_start, entry[2], 0]
+
+        weight = 1 - (now - window_start) / window
+        if entry[1] * weight + entry[2] >= limit:
+            self._store(key, entry)
+            return False, _retry_after(now, window_start, window, limit, entry[1], entry[2])
+
+        entry[2] += 1
+        self._store(key, entry)
+        return True, 0.0
+
+    def _store(self, key: str, entry: list) -> None:
+        self._windows[key] = entry
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+
+_REDIS_HIT_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local index = math.floor(now / window)
+local previous = tonumber(redis.call('HGET', KEYS[1], tostring(index - 1)) or '0')
+local current = tonumber(redis.call('HGET', KEYS[1], tostring(index)) or '0')
+local weight = 1 - (now - index * window) / window
+if previous * weight + current >= limit then
+    return {0, tostring(previous), tostring(current)}
+end
+redis.call('HINCRBY', KEYS[1], tostring(index), 1)
+redis.call('HDEL', KEYS[1], tostring(index - 2))
+redis.call('EXPIRE', KEYS[1], window * 2)
+return {1, tostring(previous), tostring(current + 1)}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """Shared limiter for multi-worker deployments.
+
+    Each key is one Redis hash of per-window counts with a native TTL; the
+    read-estimate-increment runs as a Lua script so it is atomic.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+
+        self.key_prefix = key_prefix
+        self._client = redis.from_url(url, decode_responses=True)
+        self._hit_script = self._client.register_script(_REDIS_HIT_SCRIPT)
+
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
+        now = time.time()
+        allowed, previous, current = await self._hit_script(
+            keys=[f"{self.key_prefix}{key}"], args=[limit, window, repr(now)]
+        )
+        if allowed:
+            return True, 0.0
+        window_start = now - now % window
+        return False, _retry_after(now, window_start, window, limit, int(previous), int(current))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter(settings.REDIS_URL)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemoryRateLimiter(settings.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
+
+
+rate_limiter = create_rate_limiter()
+
+# Per-IP and per-account (request body ``email``) limits for each rule.
+RATE_LIMIT_RULES = {
+    "register": (parse_rate(settings.RATE_LIMIT_REGISTER_IP), parse_rate(settings.RATE_LIMIT_REGISTER_ACCOUNT)),
+    "login": (parse_rate(settings.RATE_LIMIT_LOGIN_IP), parse_rate(settings.RATE_LIMIT_LOGIN_ACCOUNT)),
+    "verify_otp": (parse_rate(settings.RATE_LIMIT_VERIFY_OTP_IP), parse_rate(settings.RATE_LIMIT_VERIFY_OTP_ACCOUNT)),
+    "google_auth": (parse_rate(settings.RATE_LIMIT_GOOGLE_AUTH_IP), None),
+}
+
+
+def client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def _account_key(request: Request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    if not isinstance(email, str) or not email.strip():
+        return None
+    return email.lower().strip()
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please try again later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(rule: str):
+    """Dependency enforcing ``RATE_LIMIT_RULES[rule]``.
+
+    Declare it in the route's ``dependencies=`` so it runs before the
+    endpoint touches the database or the hashing pool. FastAPI has already
+    read the body by then, so the per-account check costs no extra I/O.
+    """
+    ip_rate, account_rate = RATE_LIMIT_RULES[rule]
+
+    async def dependency(request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        allowed, retry_after = await rate_limiter.hit(f"{rule}:ip:{client_ip(request)}", *ip_rate)
+        if not allowed:
+            rate_limited.inc(rule=rule, scope="ip")
+            raise _too_many_requests(retry_after)
+
+        if account_rate is None:
+            return
+        account = await _account_key(request)
+        if account is None:
+            return
+        allowed, retry_after = await rate_limiter.hit(f"{rule}:account:{account}", *account_rate)
+        if not allowed:
+            rate_limited.inc(rule=rule, scope="account")
+            raise _too_many_requests(retry_after)
+
+    return dependency
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from .config import settings
+from .crud import delete_dead_refresh_tokens_chunk
+from .db import engine, PrimarySessionLocal
+from .metrics import token_reaper_duration, token_reaper_rows, token_reaper_runs
+
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_NAME = "refresh_token_reaper"
+
+
+class TokenReaper:
+    """Periodically deletes expired and long-revoked refresh tokens.
+
+    Rows are removed in primary-key ordered chunks of ``chunk_size``, each in
+    its own short transaction with a ``chunk_pause`` sleep in between, so the
+    table is never locked for long. A database advisory lock (MySQL
+    ``GET_LOCK``, PostgreSQL ``pg_try_advisory_lock``) makes sure only one
+    replica reaps at a time; SQLite has a single writer and needs none.
+    """
+
+    def __init__(
+        self,
+        db_engine=engine,
+        session_factory=PrimarySessionLocal,
+        interval_seconds: int = 3600,
+        chunk_size: int = 1000,
+        chunk_pause: float = 0.1,
+        revoked_grace: timedelta = timedelta(hours=24),
+    ):
+        self.engine = db_engine
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.revoked_grace = revoked_grace
+        self._task = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.rows_reaped_total = 0
+        self.last_run_rows = 0
+        self.last_run_seconds = 0.0
+
+    @staticmethod
+    async def _try_lock(conn) -> bool:
+        dialect = conn.dialect.name
+        if dialect == "mysql":
+            result = await conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": LEADER_LOCK_NAME})
+            return result.scalar() == 1
+        if dialect == "postgresql":
+            result = await conn.execute(
+                text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": LEADER_LOCK_NAME}
+            )
+            return bool(result.scalar())
+        return True
+
+    @staticmethod
+    async def _unlock(conn) -> None:
+        dialect = conn.dialect.name
+        if dialect == "mysql":
+            await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LEADER_LOCK_NAME})
+        elif dialect == "postgresql":
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": LEADER_LOCK_NAME})
+
+    async def _reap(self) -> int:
+        revoked_before = datetime.utcnow() - self.revoked_grace
+        deleted_total = 0
+        last_id = 0
+        while last_id is not None:
+            async with self.session_factory() as db:
+                deleted, last_id = await delete_dead_refresh_tokens_chunk(
+                    db, last_id, self.chunk_size, revoked_before
+                )
+            deleted_total += deleted
+            if deleted < self.chunk_size:
+                break
+            await asyncio.sleep(self.chunk_pause)
+        return deleted_total
+
+    async def run_once(self) -> int:
+        """Reap if this replica wins the leader lock; returns rows deleted."""
+        async with self.engine.connect() as lock_conn:
+            if not await self._try_lock(lock_conn):
+                self.skipped_runs += 1
+                token_reaper_runs.inc(result="skipped")
+                logger.info("Token reaper lock held by another replica, skipping")
+                return 0
+
+            started = time.perf_counter()
+            try:
+                deleted = await self._reap()
+            except Exception:
+                token_reaper_runs.inc(result="failed")
+                raise
+            finally:
+                await self._unlock(lock_conn)
+
+        self.runs += 1
+        self.last_run_rows = deleted
+        self.last_run_seconds = time.perf_counter() - started
+        self.rows_reaped_total += deleted
+        token_reaper_runs.inc(result="reaped")
+        token_reaper_rows.inc(deleted)
+        token_reaper_duration.observe(self.last_run_seconds)
+        logger.info(f"Token reaper deleted {deleted} rows in {self.last_run_seconds:.2f}s")
+        return deleted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Token reaper failed: {type(e).__name__}: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "rows_reaped_total": self.rows_reaped_total,
+            "last_run_rows": self.last_run_rows,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+
+token_reaper = TokenReaper(
+    interval_seconds=settings.REAPER_INTERVAL_SECONDS,
+    chunk_size=settings.REAPER_CHUNK_SIZE,
+    chunk_pause=settings.REAPER_CHUNK_PAUSE,
+    revoked_grace=timedelta(hours=settings.REAPER_REVOKED_GRACE_HOURS),
+)
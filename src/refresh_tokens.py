@@ -0,0 +1,382 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from .config import settings
+from .crud import (
+    create_refresh_token_record,
+    evict_oldest_refresh_tokens,
+    get_refresh_token_with_user,
+    get_user_by_id,
+    get_user_active_sessions,
+    get_active_session_token_hash,
+    get_refresh_token_count_by_user,
+    rotate_refresh_token_records,
+    revoke_refresh_token_by_hash,
+    revoke_all_user_refresh_tokens,
+)
+from .db import PrimarySessionLocal
+from .token_cache import UserSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+class CachedRefreshToken:
+    __slots__ = ("token_hash", "user_id", "expires_at", "revoked", "client", "started_at", "cached_at")
+
+    def __init__(
+        self,
+        token_hash: str,
+        user_id: int,
+        expires_at: datetime,
+        revoked: bool = False,
+        client: dict = None,
+        started_at: datetime = None,
+    ):
+        self.token_hash = token_hash
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.revoked = revoked
+        # device / ip_address / user_agent and the sign-in time, copied onto
+        # the rotated token
+        self.client = client
+        self.started_at = started_at
+        self.cached_at = time.monotonic()
+
+
+class RefreshTokenRepository:
+    """Hash-indexed cache of refresh tokens in front of ``refresh_tokens``.
+
+    Lookups that hit the cache need no query, and a miss is a single
+    token+user SELECT. Entries are trusted for ``cache_ttl`` seconds, which
+    bounds how long a token revoked by another worker can still be looked up
+    here. Rotation never trusts the cache: the old token is claimed with a
+    conditional ``UPDATE ... WHERE revoked = false``, so a token is rotated
+    at most once across all workers and a replay is refused.
+
+    With ``write_behind`` only the new token's INSERT is deferred to a
+    background flush that batches every pending insert into one
+    transaction; rows reach the database within ``flush_interval`` seconds.
+    Revocations are always written inline and never dropped. Flushes hold
+    ``_flush_lock``; revoke-all and the session listing take it too, so
+    neither can run while a batch is in flight and miss tokens in it.
+
+    With ``max_sessions`` set, each new sign-in deletes the user's oldest
+    live tokens beyond that many in the same transaction as the insert, so
+    per-user rows (and the cost of a revoke-all) stay bounded. Rotations do
+    not add sessions and are not capped.
+    """
+
+    def __init__(
+        self,
+        session_factory=PrimarySessionLocal,
+        max_entries: int = 50000,
+        flush_interval: float = 0.2,
+        write_behind: bool = True,
+        max_flush_attempts: int = 5,
+        max_sessions: int = 0,
+        cache_ttl: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.write_behind = write_behind
+        self.max_flush_attempts = max_flush_attempts
+        self.max_sessions = max_sessions
+        self.cache_ttl = cache_ttl
+        self._tokens = OrderedDict()
+        self._by_user = {}
+        self._users = {}
+        self._pending_new = {}
+        # The batch the current flush is writing; empty between flushes
+        self._flushing = {}
+        self._flush_lock = asyncio.Lock()
+        # Failed flush attempts per pending token hash
+        self._flush_attempts = {}
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+        self.flushed_rotations = 0
+        self.evicted = 0
+
+    def _cache(self, token: CachedRefreshToken, user: UserSnapshot = None) -> None:
+        self._tokens[token.token_hash] = token
+        self._tokens.move_to_end(token.token_hash)
+        self._by_user.setdefault(token.user_id, set()).add(token.token_hash)
+        if user is not None:
+            self._users[user.id] = user
+
+        while len(self._tokens) > self.max_entries:
+            oldest = next(iter(self._tokens))
+            if oldest in self._pending_new or oldest in self._flushing:
+                self._tokens.move_to_end(oldest)
+                break
+            self._forget(oldest)
+
+    def _forget(self, token_hash: str) -> None:
+        token = self._tokens.pop(token_hash, None)
+        if token is None:
+            return
+        hashes = self._by_user.get(token.user_id)
+        if hashes is not None:
+            hashes.discard(token_hash)
+            if not hashes:
+                del self._by_user[token.user_id]
+                self._users.pop(token.user_id, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop the cached profile so the next lookup reloads it."""
+        self._users.pop(user_id, None)
+
+    async def add(self, db, user, token_hash: str, expires_at: datetime, client: dict = None) -> None:
+        """Insert the token and commit the session's unit of work; the token
+        is only cached once it is durable."""
+        started_at = datetime.utcnow()
+        await create_refresh_token_record(db, user.id, token_hash, expires_at, client, started_at)
+        evicted = []
+        if self.max_sessions:
+            evicted = await evict_oldest_refresh_tokens(db, user.id, self.max_sessions)
+        await db.commit()
+        for evicted_hash in evicted:
+            self._forget(evicted_hash)
+        self.evicted += len(evicted)
+        self._cache(
+            CachedRefreshToken(token_hash, user.id, expires_at, client=client, started_at=started_at),
+            UserSnapshot.from_user(user),
+        )
+
+    async def lookup(self, token_hash: str):
+        """Return ``(token, user)`` for a live token, else ``None``.
+
+        A miss reads the primary: a token issued or rotated a moment ago may
+        not have reached the replicas yet."""
+        token = self._tokens.get(token_hash)
+        user = self._users.get(token.user_id) if token is not None else None
+        # Tokens not yet flushed exist only here, so they never go stale
+        pending = token_hash in self._pending_new or token_hash in self._flushing
+        if token is not None and pending and user is None:
+            # The profile was invalidated, but the token has no row to read
+            # yet: reload just the user
+            async with self.session_factory() as db:
+                db_user = await get_user_by_id(db, token.user_id)
+            if db_user is None:
+                return None
+            user = self._users[db_user.id] = UserSnapshot.from_user(db_user)
+        fresh = token is not None and (pending or time.monotonic() - token.cached_at < self.cache_ttl)
+        if fresh and user is not None:
+            self.hits += 1
+            self._tokens.move_to_end(token_hash)
+            if token.revoked:
+                return None
+            return token, user
+
+        self.misses += 1
+        async with self.session_factory() as db:
+            row = await get_refresh_token_with_user(db, token_hash)
+        if row is None:
+            self._forget(token_hash)
+            return None
+
+        db_token, db_user = row
+        client = {
+            "device": db_token.device,
+            "ip_address": db_token.ip_address,
+            "user_agent": db_token.user_agent,
+        }
+        token = CachedRefreshToken(
+            db_token.token_hash, db_token.user_id, db_token.expires_at, client=client, started_at=db_token.started_at
+        )
+        user = UserSnapshot.from_user(db_user)
+        self._cache(token, user)
+        return token, user
+
+    async def _await_flush(self, token_hash: str) -> None:
+        """If ``token_hash`` is in the batch being written, wait until it is
+        in the database (or back in ``_pending_new`` if the flush failed)."""
+        if token_hash in self._flushing:
+            async with self._flush_lock:
+                pass
+
+    async def rotate(self, db, old: CachedRefreshToken, new_hash: str, expires_at: datetime) -> bool:
+        """Swap ``old`` for ``new_hash``; False if ``old`` was already used
+        or revoked, here or on another worker."""
+        new_row = {
+            "user_id": old.user_id,
+            "token_hash": new_hash,
+            "expires_at": expires_at,
+            "revoked": False,
+            "revoked_at": None,
+            "last_used_at": datetime.utcnow(),
+            "session_started_at": old.started_at,
+            "device": None,
+            "ip_address": None,
+            "user_agent": None,
+            **(old.client or {}),
+        }
+
+        await self._await_flush(old.token_hash)
+        pending = self._pending_new.get(old.token_hash)
+        if pending is not None:
+            # Not in the database yet (write-behind), so no other worker knows it
+            claimed = not pending["revoked"]
+            pending["revoked"] = True
+            if claimed:
+                self._pending_new[new_hash] = new_row
+        elif self.write_behind:
+            claimed = await rotate_refresh_token_records(db, [old.token_hash], [])
+            if claimed:
+                self._pending_new[new_hash] = new_row
+        else:
+            claimed = await rotate_refresh_token_records(db, [old.token_hash], [new_row])
+
+        old.revoked = True
+        if not claimed:
+            self._forget(old.token_hash)
+            return False
+        self._cache(
+            CachedRefreshToken(new_hash, old.user_id, expires_at, client=old.client, started_at=old.started_at)
+        )
+        return True
+
+    async def revoke(self, db, token_hash: str) -> bool:
+        token = self._tokens.get(token_hash)
+        if token is not None:
+            token.revoked = True
+
+        await self._await_flush(token_hash)
+        pending = self._pending_new.get(token_hash)
+        if pending is not None:
+            pending["revoked"] = True
+            return True
+
+        return await revoke_refresh_token_by_hash(db, token_hash)
+
+    async def revoke_all(self, db, user_id: int) -> int:
+        async with self._flush_lock:
+            await self._flush()
+            count = await revoke_all_user_refresh_tokens(db, user_id)
+
+            # Rotations queued while the flush and UPDATE above were running
+            for pending in self._pending_new.values():
+                if pending["user_id"] == user_id:
+                    pending["revoked"] = True
+        for token_hash in list(self._by_user.get(user_id, ())):
+            self._forget(token_hash)
+        self._users.pop(user_id, None)
+        return count
+
+    async def sessions(self, db, user_id: int, limit: int, before: tuple = None) -> tuple:
+        """``(page, total)`` of the user's live tokens; pending rotations are
+        flushed first so the listing shows the current token of each session."""
+        async with self._flush_lock:
+            await self._flush()
+            page = await get_user_active_sessions(db, user_id, limit, before)
+            return page, await get_refresh_token_count_by_user(db, user_id)
+
+    async def revoke_session(self, db, user_id: int, session_id: int) -> bool:
+        """Revoke one of ``user_id``'s live tokens by row id."""
+        async with self._flush_lock:
+            await self._flush()
+            token_hash = await get_active_session_token_hash(db, user_id, session_id)
+            if token_hash is None:
+                return False
+            return await self.revoke(db, token_hash)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _insert(self, rows: dict) -> None:
+        # Tokens revoked while pending are stamped at flush time, at most one
+        # flush interval late, which only delays the reaper
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            await rotate_refresh_token_records(
+                db, [], [{**row, "revoked_at": now if row["revoked"] else None} for row in rows.values()]
+            )
+
+    async def _flush(self) -> int:
+        """Write every pending insert in one transaction; the caller holds
+        ``_flush_lock``.
+
+        If the batch fails, its rows are retried one by one, so a bad row
+        cannot hold back (or, after ``max_flush_attempts``, drop) the tokens
+        of other users in the same batch.
+        """
+        if not self._pending_new:
+            return 0
+
+        new, self._pending_new = self._pending_new, {}
+        self._flushing = new
+        failed = {}
+        try:
+            try:
+                await self._insert(new)
+            except Exception as e:
+                logger.warning(f"Refresh token flush of {len(new)} rows failed, retrying row by row: {str(e)}")
+                for token_hash, row in new.items():
+                    try:
+                        await self._insert({token_hash: row})
+                    except Exception as row_error:
+                        failed[token_hash] = (row, row_error)
+        finally:
+            self._flushing = {}
+
+        for token_hash, (row, error) in failed.items():
+            attempts = self._flush_attempts.get(token_hash, 0) + 1
+            if attempts >= self.max_flush_attempts:
+                # Only inserts are deferred, so dropping one fails closed: the
+                # token was never durable and stops working here too
+                logger.error(f"Dropping refresh token of user {row['user_id']} after {attempts} failed flushes: {str(error)}")
+                self._flush_attempts.pop(token_hash, None)
+                self._forget(token_hash)
+            else:
+                self._flush_attempts[token_hash] = attempts
+                self._pending_new[token_hash] = row
+        for token_hash in new.keys() - failed.keys():
+            self._flush_attempts.pop(token_hash, None)
+
+        flushed = len(new) - len(failed)
+        self.flushed_rotations += flushed
+        return flushed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self.write_behind and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending_writes": len(self._pending_new) + len(self._flushing),
+            "flushed_rotations": self.flushed_rotations,
+            "evicted_sessions": self.evicted,
+        }
+
+
+refresh_token_repo = RefreshTokenRepository(
+    max_entries=settings.REFRESH_TOKEN_CACHE_SIZE,
+    flush_interval=settings.REFRESH_TOKEN_FLUSH_INTERVAL,
+    write_behind=settings.REFRESH_TOKEN_WRITE_BEHIND,
+    max_sessions=settings.MAX_SESSIONS_PER_USER,
+    cache_ttl=settings.REFRESH_TOKEN_CACHE_TTL_SECONDS,
+)
@@ -1,10 +1,8 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request, status
-from sqlalchemy.orm import Session
-import bcrypt
-import os
-from pathlib import Path
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request, Response, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 
 from .schemas import (
     UserRegistration, 
@@ -13,60 +11,84 @@ from .schemas import (
     Token, 
     GoogleAuthRequest, 
     UserResponse,
-    RefreshTokenRequest 
+    RefreshTokenRequest,
+    SessionPage,
 )
-from .crud import create_user, get_user_by_email, generate_otp, create_oauth_user, get_user_by_oauth, save_otp
-from .utils import send_otp_email 
+from .crud import (
+    create_user,
+    get_user_by_email,
+    generate_otp,
+    create_oauth_user,
+    get_user_for_oauth_login,
+    link_oauth_account,
+    enqueue_mail,
+    get_mail_outbox_stats,
+)
+from .utils import render_otp_email
+from .mail_queue import mail_dispatcher
+from .otp_store import otp_store, OTPStatus
+from .token_cache import token_cache, token_versions
+from .email_filter import email_filter
+from .keys import get_key_ring, JWKS_MAX_AGE
+from .refresh_tokens import refresh_token_repo
+from .reaper import token_reaper
+from .sessions import session_client, encode_cursor, decode_cursor
+from .pages import TEMPLATES_DIR, landing_page, static_assets
+from .bulk_users import FORMATS, ImportsBusy, import_users, export_users
 from .auth import (
     create_access_token, 
     create_refresh_token, 
     verify_google_token, 
     get_current_user,
-    verify_refresh_token, 
+    get_current_user_claims,
+    get_current_admin,
+    access_token_claims,
+    rotate_refresh_token, 
     revoke_refresh_token, 
     revoke_all_user_tokens,
-    cleanup_expired_tokens 
+    upgrade_password_hash,
 )
 from .config import settings
 from .db import get_db
+from .hashing import password_hasher
+from .metrics import registry, otp_events
+from .ratelimit import rate_limit
 
 router = APIRouter()
 
-# Fix template directory path - make it more robust
-BASE_DIR = Path(__file__).resolve().parent
-templates_dir = BASE_DIR / "templates"
-
-# Debug template directory
-print(f"Router BASE_DIR: {BASE_DIR}")
-print(f"Templates directory: {templates_dir}")
-print(f"Templates directory exists: {templates_dir.exists()}")
-
-if templates_dir.exists():
-    templates = Jinja2Templates(directory=str(templates_dir))
-else:
-    # Try alternative path
-    templates_dir = Path(os.path.dirname(os.path.abspath(__file__))) / "templates"
-    print(f"Trying alternative path: {templates_dir}")
-    templates = Jinja2Templates(directory=str(templates_dir))
+OTP_EVENTS = {
+    OTPStatus.VALID: "verified",
+    OTPStatus.INVALID: "failed",
+    OTPStatus.EXPIRED: "expired",
+    OTPStatus.LOCKED: "locked",
+}
 
 
-@router.post("/register/")
-async def register(user: UserRegistration, db: Session = Depends(get_db)):
+@router.post("/register/", dependencies=[Depends(rate_limit("register"))])
+async def register(user: UserRegistration, db: AsyncSession = Depends(get_db)):
     email = user.email.lower().strip()
     
-    if get_user_by_email(db, email):
+    if email_filter.might_contain(email) and await get_user_by_email(db, email):
         raise HTTPException(status_code=409, detail="Email already registered")
 
-    hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt())
-    create_user(db, user.username, email, hashed_password.decode('utf-8'))
+    hashed_password = await password_hasher.hash_password(user.password)
+    try:
+        await create_user(db, user.username, email, hashed_password)
+        await db.commit()
+    except IntegrityError:
+        # A concurrent registration for the same email won the race.
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Email already registered")
 
     return {"message": "User registered successfully"}
 
 
-@router.post("/login/")
-async def login(user: UserLogin, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+@router.post("/login/", dependencies=[Depends(rate_limit("login"))])
+async def login(user: UserLogin, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     email = user.email.lower().strip()
-    db_user = get_user_by_email(db, email)
+    # Not the email filter: an account registered on another worker since its
+    # last sync would be a false "not found"
+    db_user = await get_user_by_email(db, email)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -74,44 +96,48 @@ async def login(user: UserLogin, background_tasks: BackgroundTasks, db: Session
     if not db_user.hashed_password:
         raise HTTPException(status_code=400, detail="Please use Google Sign-In for this account")
 
-    if not bcrypt.checkpw(user.password.encode("utf-8"), db_user.hashed_password.encode("utf-8")):
+    if not await password_hasher.check_password(user.password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
+    if password_hasher.needs_rehash(db_user.hashed_password):
+        background_tasks.add_task(upgrade_password_hash, db_user.id, db_user.hashed_password, user.password)
+
     otp = generate_otp(db, email)
 
-    save_otp(db, db_user, otp, settings.OTP_TTL_SECONDS)
-    background_tasks.add_task(send_otp_email, db_user.email, otp)
+    await otp_store.save(email, otp, settings.OTP_TTL_SECONDS)
+    subject, body = render_otp_email(otp)
+    await enqueue_mail(db, db_user.email, "otp", subject, body)
+    await db.commit()
+    mail_dispatcher.notify()
 
     return {"message": f"OTP sent to email (expires in {settings.OTP_TTL_SECONDS} seconds)"}
 
 
-@router.post("/verify_otp/", response_model=Token)
-async def verify_otp(otp_data: OTPVerification, db: Session = Depends(get_db)):
-    from datetime import datetime  
+@router.post("/verify_otp/", response_model=Token, dependencies=[Depends(rate_limit("verify_otp"))])
+async def verify_otp(otp_data: OTPVerification, request: Request, db: AsyncSession = Depends(get_db)):
     email = otp_data.email.lower().strip()
-    db_user = get_user_by_email(db, email)
+    db_user = await get_user_by_email(db, email)
     
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    now = datetime.utcnow()  
-    if not db_user.otp_expires_at or db_user.otp_expires_at < now:
-        db_user.otp = None
-        db_user.otp_expires_at = None
-        db.commit()
+    result = await otp_store.verify(email, otp_data.otp, settings.OTP_ATTEMPTS)
+    otp_events.inc(event=OTP_EVENTS[result])
+
+    if result == OTPStatus.EXPIRED:
         raise HTTPException(status_code=400, detail="OTP expired! Login again.")
-    
-    if str(db_user.otp) != str(otp_data.otp):
+
+    if result == OTPStatus.LOCKED:
+        raise HTTPException(status_code=400, detail="Too many attempts! Login again.")
+
+    if result != OTPStatus.VALID:
         raise HTTPException(status_code=400, detail="Invalid OTP")
     
-    # Clear OTP
-    db_user.otp = None
-    db_user.otp_expires_at = None
-    db.commit()
-    
-    # Create tokens
-    access_token = create_access_token(data={"sub": db_user.email, "user_id": db_user.id})
-    refresh_token = create_refresh_token(db=db, user_id=db_user.id, email=db_user.email)
+    # Create tokens; the row was just read, so claims-only auth can skip
+    # its token_version check for this user for a while
+    token_versions.observe(db_user.id, db_user.token_version)
+    access_token = create_access_token(data=access_token_claims(db_user))
+    refresh_token = await create_refresh_token(db, db_user, session_client(request))
     
     return {
         "access_token": access_token,
@@ -127,23 +153,20 @@ async def verify_otp(otp_data: OTPVerification, db: Session = Depends(get_db)):
     }
 
 @router.post("/auth/refresh", response_model=Token)
-async def refresh_access_token(refresh_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def refresh_access_token(refresh_data: RefreshTokenRequest, db: AsyncSession = Depends(get_db)):
     
     
-    user = verify_refresh_token(db, refresh_data.refresh_token)
+    # Revokes the old refresh token (one-time use) and issues a new one
+    rotated = await rotate_refresh_token(db, refresh_data.refresh_token)
     
-    if not user:
+    if not rotated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token"
         )
     
-    # Revoke the old refresh token (one-time use)
-    revoke_refresh_token(db, refresh_data.refresh_token)
-    
-    # Create new tokens
-    access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
-    new_refresh_token = create_refresh_token(db=db, user_id=user.id, email=user.email)
+    user, new_refresh_token = rotated
+    access_token = create_access_token(data=access_token_claims(user))
     
     return {
         "access_token": access_token,
@@ -160,34 +183,65 @@ async def refresh_access_token(refresh_data: RefreshTokenRequest, db: Session =
 
 
 @router.post("/auth/logout")
-async def logout(refresh_data: RefreshTokenRequest, current_user = Depends(get_current_user), db: Session = Depends(get_db)):
+async def logout(refresh_data: RefreshTokenRequest, current_user = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     
-    revoke_refresh_token(db, refresh_data.refresh_token)
+    await revoke_refresh_token(db, refresh_data.refresh_token)
     return {"message": "Logged out successfully"}
 
 
 @router.post("/auth/logout-all")
-async def logout_all_devices(current_user = Depends(get_current_user), db: Session = Depends(get_db)):
-    revoke_all_user_tokens(db, current_user.id)
+async def logout_all_devices(current_user = Depends(get_current_user_claims), db: AsyncSession = Depends(get_db)):
+    await revoke_all_user_tokens(db, current_user.id)
     return {"message": "Logged out from all devices"}
 
 
+@router.get("/auth/sessions", response_model=SessionPage)
+async def list_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = None,
+    current_user = Depends(get_current_user_claims),
+    db: AsyncSession = Depends(get_db),
+):
+    """The caller's signed-in devices, newest first; pass ``next_cursor``
+    back as ``cursor`` for the next page."""
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    sessions, total = await refresh_token_repo.sessions(db, current_user.id, limit, before)
+    next_cursor = None
+    if len(sessions) == limit:
+        next_cursor = encode_cursor(sessions[-1].expires_at, sessions[-1].id)
+    return {"sessions": sessions, "total": total, "next_cursor": next_cursor}
+
+
+@router.delete("/auth/sessions/{session_id}")
+async def revoke_session(session_id: int, current_user = Depends(get_current_user_claims), db: AsyncSession = Depends(get_db)):
+    if not await refresh_token_repo.revoke_session(db, current_user.id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked"}
+
+
+@router.get("/.well-known/jwks.json")
+async def jwks(response: Response):
+    response.headers["Cache-Control"] = f"public, max-age={JWKS_MAX_AGE}"
+    key_ring = get_key_ring()
+    return key_ring.jwks() if key_ring is not None else {"keys": []}
+
+
 @router.get("/", response_class=HTMLResponse)
 async def root(request: Request):
+    # Rendered once per process; clients revalidate with If-None-Match
+    return landing_page.get().response(request, "no-cache")
 
-    client_id = settings.GOOGLE_CLIENT_ID
-    print(f"Rendering template with GOOGLE_CLIENT_ID: {client_id[:20] if client_id else 'NONE'}...")
-    
-    if not client_id:
-        print("❌ ERROR: GOOGLE_CLIENT_ID is None or empty!")
-    
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "google_client_id": client_id or ""  # Provide empty string as fallback
-        }
-    )
+
+@router.get("/static/{path:path}")
+async def static_file(path: str, request: Request, v: str = None):
+    asset = static_assets.get(path)
+    if asset is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return asset.response(request, static_assets.cache_control(asset, v))
 
 
 @router.get("/debug/check-config")
@@ -197,55 +251,63 @@ async def check_config():
         "google_client_id_exists": bool(settings.GOOGLE_CLIENT_ID),
         "google_client_id_length": len(settings.GOOGLE_CLIENT_ID) if settings.GOOGLE_CLIENT_ID else 0,
         "google_client_id_preview": settings.GOOGLE_CLIENT_ID[:20] + "..." if settings.GOOGLE_CLIENT_ID else "EMPTY",
-        "templates_dir": str(templates_dir),
-        "templates_dir_exists": templates_dir.exists(),
-        "template_files": list(templates_dir.glob("*.html")) if templates_dir.exists() else []
+        "templates_dir": str(TEMPLATES_DIR),
+        "templates_dir_exists": TEMPLATES_DIR.exists(),
+        "template_files": list(TEMPLATES_DIR.glob("*.html")) if TEMPLATES_DIR.exists() else []
     }
 
 
-@router.post("/auth/google", response_model=Token)
-async def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db)):
+@router.post("/auth/google", response_model=Token, dependencies=[Depends(rate_limit("google_auth"))])
+async def google_auth(auth_data: GoogleAuthRequest, request: Request, db: AsyncSession = Depends(get_db)):
     """Handle Google OAuth authentication"""
     # Verify the Google token
-    google_user = verify_google_token(auth_data.token)
+    google_user = await verify_google_token(auth_data.token)
     
     if not google_user:
         raise HTTPException(status_code=400, detail="Invalid Google token")
     
     email = google_user['email'].lower()
     
-    # Check if user exists
-    db_user = get_user_by_email(db, email)
-    
-    if not db_user:
-        # Check if OAuth user exists
-        db_user = get_user_by_oauth(db, 'google', google_user['google_id'])
+    # Existing account by email, else one already linked to this Google id
+    db_user = await get_user_for_oauth_login(db, email, 'google', google_user['google_id'])
     
     if not db_user:
         # Create new user
-        db_user = create_oauth_user(
-            db=db,
-            email=email,
-            username=google_user['name'],
-            oauth_provider='google',
-            oauth_id=google_user['google_id'],
-            profile_picture=google_user.get('picture')
+        try:
+            db_user = await create_oauth_user(
+                db=db,
+                email=email,
+                username=google_user['name'],
+                oauth_provider='google',
+                oauth_id=google_user['google_id'],
+                profile_picture=google_user.get('picture')
+            )
+        except IntegrityError:
+            # A concurrent first sign-in created the account. The rollback
+            # unpins the session and replicas may not have the row yet, so
+            # read it back from the primary.
+            await db.rollback()
+            db.info["pinned"] = True
+            db_user = await get_user_for_oauth_login(db, email, 'google', google_user['google_id'])
+    elif not db_user.oauth_provider:
+        # Link OAuth info to an existing password account
+        linked = await link_oauth_account(
+            db, db_user.id, 'google', google_user['google_id'], google_user.get('picture')
         )
-    else:
-        # Update existing user with OAuth info if not set
-        if not db_user.oauth_provider:
-            db_user.oauth_provider = 'google'
-            db_user.oauth_id = google_user['google_id']
-            db_user.profile_picture = google_user.get('picture')
-            db_user.is_verified = True
-            db.commit()
-            db.refresh(db_user)
+        if linked:
+            set_committed_value(db_user, 'oauth_provider', 'google')
+            set_committed_value(db_user, 'oauth_id', google_user['google_id'])
+            set_committed_value(db_user, 'profile_picture', google_user.get('picture'))
+            set_committed_value(db_user, 'is_verified', True)
+            token_cache.invalidate_user(db_user.id)
+            refresh_token_repo.invalidate_user(db_user.id)
     
     # Create access token
-    access_token = create_access_token(data={"sub": db_user.email, "user_id": db_user.id})
+    token_versions.observe(db_user.id, db_user.token_version)
+    access_token = create_access_token(data=access_token_claims(db_user))
     
-    # Create and store refresh token
-    refresh_token = create_refresh_token(db=db, user_id=db_user.id, email=db_user.email)
+    # Create and store refresh token; this commits the whole sign-in
+    refresh_token = await create_refresh_token(db, db_user, session_client(request))
     
     return {
         "access_token": access_token,
@@ -263,11 +325,71 @@ async def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db
 
 
 @router.get("/auth/me", response_model=UserResponse)
-async def read_current_user(current_user = Depends(get_current_user)):
+async def read_current_user(current_user = Depends(get_current_user_claims)):
     return current_user
 
 
 @router.post("/admin/cleanup-tokens")
-async def cleanup_tokens(current_user = Depends(get_current_user),db: Session = Depends(get_db)):
-    deleted = cleanup_expired_tokens(db)
-    return {"message": f"Cleaned up {deleted} tokens"}
\ No newline at end of file
+async def cleanup_tokens(current_user = Depends(get_current_admin)):
+    """Run the background reaper immediately (it also runs on a schedule)."""
+    deleted = await token_reaper.run_once()
+    return {"message": f"Cleaned up {deleted} tokens", "reaper": token_reaper.stats()}
+
+
+@router.post("/admin/users/import")
+async def bulk_import_users(request: Request, format: str = None, batch_size: int = None, current_user = Depends(get_current_admin)):
+    """Stream a CSV or NDJSON body of users into the database."""
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    try:
+        report = await import_users(request.stream(), fmt, batch_size=batch_size)
+    except ImportsBusy:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="An import is already running, try again when it finishes",
+            headers={"Retry-After": "30"},
+        )
+    return report.as_dict()
+
+
+@router.get("/admin/users/export")
+async def bulk_export_users(format: str = "ndjson", current_user = Depends(get_current_admin)):
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        export_users(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+@router.get("/admin/mail-queue")
+async def mail_queue_stats(current_user = Depends(get_current_admin), db: AsyncSession = Depends(get_db)):
+    return await get_mail_outbox_stats(db)
+
+
+@router.get("/admin/token-cache-stats")
+async def token_cache_stats(current_user = Depends(get_current_admin)):
+    return token_cache.stats()
+
+
+@router.get("/admin/refresh-token-stats")
+async def refresh_token_stats(current_user = Depends(get_current_admin)):
+    return refresh_token_repo.stats()
+
+
+@router.get("/admin/email-filter-stats")
+async def email_filter_stats(current_user = Depends(get_current_admin)):
+    return email_filter.stats()
+
+
+@router.get("/admin/hashing-stats")
+async def hashing_stats(current_user = Depends(get_current_admin)):
+    return password_hasher.get_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
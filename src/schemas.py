@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class UserRegistration(BaseModel):
@@ -11,6 +11,26 @@ class UserRegistration(BaseModel):
     class Config:
         from_attributes=True
 
+class BulkUserRecord(BaseModel):
+    """One row of a bulk user import.
+
+    Either a plaintext ``password`` (hashed on import) or an existing bcrypt
+    or argon2id ``hashed_password``; rows with neither become Google Sign-In
+    only accounts.
+    """
+    username: str = Field(..., min_length=3, max_length=25)
+    email: EmailStr
+    password: Optional[str] = Field(None, min_length=8, max_length=128)
+    hashed_password: Optional[str] = None
+    is_verified: bool = False
+
+    @field_validator("hashed_password")
+    @classmethod
+    def check_password_hash(cls, value):
+        if value is not None and not value.startswith(("$2a$", "$2b$", "$2y$", "$argon2id$")):
+            raise ValueError("hashed_password must be a bcrypt or argon2id hash")
+        return value
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str 
@@ -41,6 +61,24 @@ class RefreshTokenRequest(BaseModel):
 class GoogleAuthRequest(BaseModel):
     token: str
 
+class SessionResponse(BaseModel):
+    id: int
+    device: Optional[str] = None
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    # When the device signed in, not when its current (rotated) token was issued
+    created_at: datetime = Field(validation_alias="started_at")
+    last_used_at: Optional[datetime] = None
+    expires_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class SessionPage(BaseModel):
+    sessions: List[SessionResponse]
+    total: int
+    next_cursor: Optional[str] = None
+
 class UserResponse(BaseModel):
     id: int
     username: str
@@ -0,0 +1,59 @@
+import base64
+from datetime import datetime
+
+from fastapi import Request
+
+from .ratelimit import client_ip
+
+
+# First match wins; checked against the User-Agent header in order.
+_PLATFORMS = (
+    ("iPhone", "iPhone"),
+    ("iPad", "iPad"),
+    ("Android", "Android"),
+    ("Windows", "Windows"),
+    ("Macintosh", "macOS"),
+    ("CrOS", "ChromeOS"),
+    ("Linux", "Linux"),
+)
+_BROWSERS = (
+    ("Edg/", "Edge"),
+    ("OPR/", "Opera"),
+    ("Firefox/", "Firefox"),
+    ("Chrome/", "Chrome"),
+    ("Safari/", "Safari"),
+    ("curl/", "curl"),
+)
+
+
+def describe_device(user_agent: str):
+    """A short label like ``"Chrome on Windows"`` for the sessions list."""
+    if not user_agent:
+        return None
+    platform = next((name for marker, name in _PLATFORMS if marker in user_agent), None)
+    browser = next((name for marker, name in _BROWSERS if marker in user_agent), None)
+    if browser and platform:
+        return f"{browser} on {platform}"
+    return browser or platform or user_agent[:100]
+
+
+def session_client(request: Request) -> dict:
+    """Columns recorded on a refresh token when a session starts."""
+    user_agent = request.headers.get("user-agent")
+    return {
+        "device": describe_device(user_agent),
+        "ip_address": client_ip(request)[:45],
+        "user_agent": user_agent[:500] if user_agent else None,
+    }
+
+
+def encode_cursor(expires_at: datetime, token_id: int) -> str:
+    raw = f"{expires_at.isoformat()}|{token_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of ``encode_cursor``; raises ``ValueError`` on garbage."""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    expires_at, token_id = raw.split("|")
+    return datetime.fromisoformat(expires_at), int(token_id)
@@ -0,0 +1,282 @@
+const API_BASE = window.location.origin;
+let currentUser = null;
+
+// Debug logging
+console.log('=== Google OAuth Configuration ===');
+console.log('Client ID:', GOOGLE_CLIENT_ID);
+console.log('Client ID valid:', GOOGLE_CLIENT_ID && !GOOGLE_CLIENT_ID.includes('{'));
+console.log('===================================');
+
+// Initialize Google Sign-In with new method
+function initGoogleSignIn() {
+    if (!GOOGLE_CLIENT_ID || GOOGLE_CLIENT_ID.includes('{')) {
+        console.error('❌ Google Client ID not configured');
+        showMessage('Google Client ID not configured', 'error');
+        // Show fallback button
+        document.getElementById('custom-google-btn').style.display = 'flex';
+        document.getElementById('custom-google-btn-register').style.display = 'flex';
+        return;
+    }
+    
+    try {
+        // Initialize with callback
+        google.accounts.id.initialize({
+            client_id: GOOGLE_CLIENT_ID,
+            callback: handleGoogleCallback,
+            auto_select: false,
+            cancel_on_tap_outside: false,
+        });
+        
+        // Render button in login tab
+        google.accounts.id.renderButton(
+            document.getElementById('google-button-container'),
+            {
+                theme: 'outline',
+                size: 'large',
+                width: '100%',
+                text: 'continue_with',
+                shape: 'rectangular',
+            }
+        );
+        
+        // Render button in register tab
+        google.accounts.id.renderButton(
+            document.getElementById('google-button-container-register'),
+            {
+                theme: 'outline',
+                size: 'large',
+                width: '100%',
+                text: 'continue_with',
+                shape: 'rectangular',
+            }
+        );
+        
+        console.log('✅ Google Sign-In initialized successfully');
+    } catch (error) {
+        console.error('❌ Failed to initialize Google Sign-In:', error);
+        showMessage('Failed to initialize Google Sign-In', 'error');
+        // Show fallback button
+        document.getElementById('custom-google-btn').style.display = 'flex';
+        document.getElementById('custom-google-btn-register').style.display = 'flex';
+    }
+}
+
+// Handle Google Sign-In callback
+async function handleGoogleCallback(response) {
+    try {
+        console.log('Google callback received');
+        showMessage('Processing Google login...', 'success');
+        
+        const res = await fetch(`${API_BASE}/auth/google`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ token: response.credential })
+        });
+        
+        const data = await res.json();
+        
+        if (res.ok) {
+            localStorage.setItem('access_token', data.access_token);
+            currentUser = data.user;
+            showDashboard(data.user);
+            showMessage('Successfully logged in with Google!', 'success');
+        } else {
+            showMessage(data.detail || 'Google login failed', 'error');
+        }
+    } catch (error) {
+        console.error('Google callback error:', error);
+        showMessage('Error: ' + error.message, 'error');
+    }
+}
+
+// Fallback Google login using prompt
+function handleGoogleLoginFallback() {
+    try {
+        console.log('Using fallback Google login method');
+        
+        if (!GOOGLE_CLIENT_ID || GOOGLE_CLIENT_ID.includes('{')) {
+            showMessage('Google Client ID not configured', 'error');
+            return;
+        }
+        
+        google.accounts.id.prompt((notification) => {
+            console.log('Notification:', notification);
+            
+            if (notification.isNotDisplayed()) {
+                showMessage('Google popup blocked. Please allow popups for this site.', 'error');
+            } else if (notification.isSkippedMoment()) {
+                showMessage('Google sign-in was skipped. Please try again.', 'error');
+            }
+        });
+    } catch (error) {
+        console.error('Fallback login error:', error);
+        showMessage('Error: ' + error.message, 'error');
+    }
+}
+
+// Traditional Login
+async function handleLogin(event) {
+    event.preventDefault();
+    
+    const email = document.getElementById('login-email').value;
+    const password = document.getElementById('login-password').value;
+    
+    try {
+        const res = await fetch(`${API_BASE}/login/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ email, password })
+        });
+        
+        const data = await res.json();
+        
+        if (res.ok) {
+            showMessage(data.message, 'success');
+            setTimeout(() => {
+                const otp = prompt('Enter the OTP sent to your email:');
+                if (otp) {
+                    verifyOTP(email, otp);
+                }
+            }, 1000);
+        } else {
+            showMessage(data.detail, 'error');
+        }
+    } catch (error) {
+        showMessage('Error: ' + error.message, 'error');
+    }
+}
+
+// Register
+async function handleRegister(event) {
+    event.preventDefault();
+    
+    const username = document.getElementById('register-username').value;
+    const email = document.getElementById('register-email').value;
+    const password = document.getElementById('register-password').value;
+    
+    try {
+        const res = await fetch(`${API_BASE}/register/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ username, email, password })
+        });
+        
+        const data = await res.json();
+        
+        if (res.ok) {
+            showMessage(data.message + ' - Please login now.', 'success');
+            switchTab('login');
+            document.getElementById('registerForm').reset();
+        } else {
+            showMessage(data.detail, 'error');
+        }
+    } catch (error) {
+        showMessage('Error: ' + error.message, 'error');
+    }
+}
+
+// Verify OTP
+async function verifyOTP(email, otp) {
+    try {
+        const res = await fetch(`${API_BASE}/verify_otp/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ email, otp })
+        });
+        
+        const data = await res.json();
+        
+        if (res.ok) {
+            localStorage.setItem('access_token', data.access_token);
+            currentUser = data.user;
+            showDashboard(data.user);
+            showMessage('Login successful!', 'success');
+        } else {
+            showMessage(data.detail, 'error');
+        }
+    } catch (error) {
+        showMessage('Error: ' + error.message, 'error');
+    }
+}
+
+// Switch tabs
+function switchTab(tab) {
+    document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
+    document.querySelectorAll('.tab-content').forEach(tc => tc.classList.remove('active'));
+    
+    if (tab === 'login') {
+        document.querySelectorAll('.tab')[0].classList.add('active');
+        document.getElementById('login-tab').classList.add('active');
+    } else {
+        document.querySelectorAll('.tab')[1].classList.add('active');
+        document.getElementById('register-tab').classList.add('active');
+    }
+}
+
+// Show message
+function showMessage(msg, type) {
+    const messageDiv = document.getElementById('message');
+    messageDiv.textContent = msg;
+    messageDiv.className = `message ${type}`;
+    messageDiv.style.display = 'block';
+    
+    setTimeout(() => {
+        messageDiv.style.display = 'none';
+    }, 5000);
+}
+
+// Show dashboard
+function showDashboard(user) {
+    document.getElementById('auth-section').style.display = 'none';
+    document.getElementById('dashboard-section').style.display = 'block';
+    document.getElementById('user-avatar').src = user.profile_picture || 'https://via.placeholder.com/80';
+    document.getElementById('user-name').textContent = user.username;
+    document.getElementById('user-email').textContent = user.email;
+}
+
+// Logout
+function handleLogout() {
+    localStorage.removeItem('access_token');
+    currentUser = null;
+    document.getElementById('auth-section').style.display = 'block';
+    document.getElementById('dashboard-section').style.display = 'none';
+    showMessage('Logged out successfully', 'success');
+}
+
+// Initialize on page load
+window.onload = function() {
+    console.log('Page loaded, initializing...');
+    
+    // Wait for Google library to load
+    const checkGoogleLoaded = setInterval(() => {
+        if (typeof google !== 'undefined' && google.accounts) {
+            clearInterval(checkGoogleLoaded);
+            initGoogleSignIn();
+        }
+    }, 100);
+    
+    // Timeout after 5 seconds
+    setTimeout(() => {
+        clearInterval(checkGoogleLoaded);
+        if (typeof google === 'undefined') {
+            console.error('Google Sign-In library failed to load');
+            showMessage('Failed to load Google Sign-In. Please refresh the page.', 'error');
+            document.getElementById('custom-google-btn').style.display = 'flex';
+            document.getElementById('custom-google-btn-register').style.display = 'flex';
+        }
+    }, 5000);
+    
+    // Check if user is already logged in
+    const token = localStorage.getItem('access_token');
+    if (token) {
+        console.log('User has existing token');
+    }
+};
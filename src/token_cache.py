@@ -0,0 +1,166 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from .config import settings
+
+
+class UserSnapshot:
+    """The handful of ``User`` fields authenticated routes actually read."""
+
+    __slots__ = ("id", "username", "email", "oauth_provider", "profile_picture", "is_verified", "token_version")
+
+    def __init__(self, id, username, email, oauth_provider=None, profile_picture=None, is_verified=False, token_version=0):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.oauth_provider = oauth_provider
+        self.profile_picture = profile_picture
+        self.is_verified = bool(is_verified)
+        self.token_version = token_version or 0
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            oauth_provider=user.oauth_provider,
+            profile_picture=user.profile_picture,
+            is_verified=user.is_verified,
+            token_version=user.token_version,
+        )
+
+    def __repr__(self):
+        return f"<UserSnapshot(id='{self.id}', email='{self.email}')>"
+
+
+class TokenCache:
+    """Bounded LRU of already-verified access tokens keyed by SHA-256 digest.
+
+    An entry lives for ``ttl_seconds`` or until the token's ``exp``,
+    whichever comes first. Entries are indexed by user id so a revoke-all or
+    profile change can drop every cached token of that user.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def _drop(self, digest: bytes) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        user_digests = self._by_user.get(entry[2].id)
+        if user_digests is not None:
+            user_digests.discard(digest)
+            if not user_digests:
+                del self._by_user[entry[2].id]
+
+    def get(self, token: str):
+        """Return ``(claims, snapshot)`` for a cached token, else ``None``."""
+        digest = self._digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, claims, snapshot = entry
+        if expires_at <= time.monotonic():
+            self._drop(digest)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return claims, snapshot
+
+    def put(self, token: str, claims: dict, snapshot: UserSnapshot) -> None:
+        ttl = self.ttl_seconds
+        if "exp" in claims:
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl <= 0:
+            return
+
+        digest = self._digest(token)
+        self._drop(digest)
+        self._entries[digest] = (time.monotonic() + ttl, claims, snapshot)
+        self._by_user.setdefault(snapshot.id, set()).add(digest)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> int:
+        digests = self._by_user.pop(user_id, set())
+        for digest in digests:
+            self._entries.pop(digest, None)
+        return len(digests)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TokenVersionRegistry:
+    """Bounded LRU of each user's ``token_version`` as last read from the database.
+
+    Fed from revoke-all and from every user row this process loads. An entry
+    is trusted for ``ttl_seconds``; after that, or when the user has no entry
+    (another worker, a restart), ``get`` returns None and the caller reads
+    the version again, so a revoke-all on any worker is enforced here within
+    ``ttl_seconds``.
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl_seconds: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._versions = OrderedDict()
+
+    def observe(self, user_id: int, version: int) -> None:
+        # Versions only go up; an older read must not lower the floor
+        entry = self._versions.get(user_id)
+        version = max(version or 0, entry[0] if entry is not None else 0)
+        self._versions[user_id] = (version, time.monotonic())
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+
+    def get(self, user_id: int):
+        """The cached version, or None if it is missing or stale."""
+        entry = self._versions.get(user_id)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl_seconds:
+            return None
+        return entry[0]
+
+
+token_versions = TokenVersionRegistry(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOKEN_VERSION_TTL_SECONDS,
+)
+
+token_cache = TokenCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOKEN_CACHE_TTL_SECONDS,
+)
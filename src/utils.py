@@ -1,38 +1,168 @@
 import smtplib
 import ssl
 import logging
+import queue
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from .config import settings
+from .metrics import smtp_send_duration
 
 
 logger = logging.getLogger(__name__)
 
 
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open and reuses them across messages.
+
+    Up to ``size`` connections are held; a connection is retired after
+    ``max_messages`` messages or once it has been idle for ``idle_timeout``
+    seconds. A send that hits a dropped session reconnects and retries once.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = None,
+        password: str = None,
+        size: int = 4,
+        timeout: int = 10,
+        use_starttls: bool = True,
+        max_messages: int = 100,
+        idle_timeout: int = 60,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.use_starttls = use_starttls
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def _connect(self) -> dict:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_starttls:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        logger.debug(f"Opened SMTP connection to {self.host}:{self.port}")
+        return {"server": server, "sent": 0, "last_used": time.monotonic()}
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self) -> dict:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - conn["last_used"] < self.idle_timeout:
+                return conn
+            self._close(conn["server"])
+
+    def _checkin(self, conn: dict) -> None:
+        if conn["sent"] >= self.max_messages:
+            self._close(conn["server"])
+            return
+        conn["last_used"] = time.monotonic()
+        self._idle.put(conn)
+
+    def _send_on(self, conn: dict, message: MIMEMultipart) -> dict:
+        try:
+            conn["server"].sendmail(message["From"], message["To"], message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            logger.info("SMTP connection dropped, reconnecting")
+            self._close(conn["server"])
+            conn = self._connect()
+            conn["server"].sendmail(message["From"], message["To"], message.as_string())
+        conn["sent"] += 1
+        return conn
+
+    def send(self, message: MIMEMultipart) -> None:
+        failures = self.send_many([message])
+        if failures:
+            raise failures[0][1]
+
+    def send_many(self, messages: list) -> list:
+        """Send ``messages`` over a single pooled session.
+
+        Returns a list of ``(message, exception)`` pairs for the messages
+        that were rejected; an empty list means everything was accepted.
+        """
+        failures = []
+        with self._slots:
+            conn = self._checkout()
+            try:
+                for message in messages:
+                    if conn["sent"] >= self.max_messages:
+                        self._close(conn["server"])
+                        conn = self._connect()
+                    started = time.perf_counter()
+                    try:
+                        conn = self._send_on(conn, message)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        failures.append((message, e))
+                    smtp_send_duration.observe(time.perf_counter() - started)
+            except Exception:
+                self._close(conn["server"])
+                raise
+            self._checkin(conn)
+
+        return failures
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn["server"])
+
+
+smtp_pool = SMTPConnectionPool(
+    host=settings.SMTP_HOST,
+    port=settings.SMTP_PORT,
+    username=settings.SENDER_EMAIL,
+    password=settings.SENDER_PASSWORD,
+    size=settings.SMTP_POOL_SIZE,
+    timeout=settings.SMTP_TIMEOUT,
+    use_starttls=settings.SMTP_STARTTLS,
+    max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+    idle_timeout=settings.SMTP_IDLE_TIMEOUT,
+)
+
+
+def build_message(to_email: str, subject: str, body: str) -> MIMEMultipart:
+    message = MIMEMultipart()
+    message["From"] = settings.SENDER_EMAIL
+    message["To"] = to_email
+    message["Subject"] = subject
+
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+
 def send_email(to_email: str, subject: str, body: str) -> None:
     try:
         logger.info(f"Sending email to {to_email}...")
 
-        message = MIMEMultipart()
-        message["From"] = settings.SENDER_EMAIL
-        message["To"] = to_email
-        message["Subject"] = subject
-
-        message.attach(MIMEText(body, "plain"))
-        
-        context = ssl.create_default_context()
-        
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=60) as server:
-            server.ehlo()
-            server.starttls(context=context)
-            server.ehlo()
-            server.login(settings.SENDER_EMAIL, settings.SENDER_PASSWORD)
-
-            server.sendmail(
-                settings.SENDER_EMAIL,
-                to_email,
-                message.as_string(),
-            )
+        smtp_pool.send(build_message(to_email, subject, body))
 
         logger.info(f"Email sent successfully to {to_email}")
 
@@ -41,18 +171,19 @@ def send_email(to_email: str, subject: str, body: str) -> None:
         raise
 
 
+def render_otp_email(otp: str) -> tuple:
+    subject = "Your OTP for Login"
+    body = (
+        f"Your One-Time Passcode (OTP) is: {otp}\n\n"
+        f"It expires in {settings.OTP_TTL_SECONDS} seconds."
+    )
+    return subject, body
 
 
 def send_otp_email(to_email: str, otp: str) -> None:
     try:
-        send_email(
-            to_email=to_email,
-            subject="Your OTP for Login",
-            body=(
-                f"Your One-Time Passcode (OTP) is: {otp}\n\n"
-                f"It expires in {settings.OTP_TTL_SECONDS} seconds."
-            )
-        )
+        subject, body = render_otp_email(otp)
+        send_email(to_email=to_email, subject=subject, body=body)
     except Exception as e:
         logger.error(f"Failed to send OTP to {to_email}: {str(e)}")
         raise